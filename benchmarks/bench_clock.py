@@ -0,0 +1,49 @@
+import argparse
+import timeit
+import warnings
+from datetime import datetime
+
+from pylibcklb.time.common import get_current_utc_time_ms, get_current_utc_time, get_epoch_ms, stamp_documents
+
+
+# datetime.utcnow is deprecated since python 3.12
+warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*utcnow")
+
+
+def get_current_utc_time_ms_reference():
+    # the previous implementation of get_current_utc_time_ms
+    return datetime.utcnow().isoformat(timespec='milliseconds')
+
+
+def run_benchmark(number: int, repeat: int, batch_size: int) -> dict:
+    candidates = {
+        "datetime.utcnow().isoformat (reference)": get_current_utc_time_ms_reference,
+        "get_current_utc_time_ms": get_current_utc_time_ms,
+        "get_current_utc_time_ms(with_offset=True)": lambda: get_current_utc_time_ms(with_offset=True),
+        "get_current_utc_time": get_current_utc_time,
+        "get_epoch_ms": get_epoch_ms,
+    }
+    results = {name: number / min(timeit.repeat(function, number=number, repeat=repeat))
+               for name, function in candidates.items()}
+    documents = [{} for _ in range(batch_size)]
+    batches_per_second = 1 / min(timeit.repeat(lambda: stamp_documents(documents), number=1, repeat=repeat))
+    results[f"stamp_documents (batch of {batch_size})"] = batches_per_second * batch_size
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the timestamps of pylibcklb.time.common")
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    arguments = parser.parse_args()
+
+    results = run_benchmark(arguments.number, arguments.repeat, arguments.batch_size)
+    reference = results["datetime.utcnow().isoformat (reference)"]
+    print(f"{'function':<46}{'stamps/s':>14}{'speedup':>10}")
+    for name, stamps_per_second in results.items():
+        print(f"{name:<46}{stamps_per_second:>14.0f}{stamps_per_second / reference:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
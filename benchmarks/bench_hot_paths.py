@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from documents import create_build_env_document  # noqa: E402
+from fake_mongo import FakeClient  # noqa: E402
+from pylibcklb.calculation.common import get_size  # noqa: E402
+from pylibcklb.json.common import load_data, create_json_file, append_json_lines  # noqa: E402
+from pylibcklb.mongo.common import check_id, check_schema_version  # noqa: E402
+from pylibcklb.scripts import sendJson2Mongo  # noqa: E402
+from pylibcklb.scripts.extractBuildEnvInfo import COLLECTORS  # noqa: E402
+
+# number of environment variables per document, they make up most of the size of a build environment document
+DOCUMENT_SIZES = {"small": 10, "medium": 80, "large": 1000}
+SEND_FILE_COUNT = 10
+RESULTS_FORMAT_VERSION = 1
+
+
+def measure(function, operations: int, repeat: int, setup=None) -> dict:
+    # the fastest of the runs, the setup of every run is not measured
+    seconds = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state)
+        seconds.append(time.perf_counter() - start)
+    best_seconds = min(seconds)
+    return {"operations": operations, "seconds": best_seconds,
+            "operations_per_second": operations / best_seconds if best_seconds > 0 else float("inf")}
+
+
+def create_documents(size: str, count: int) -> list:
+    documents = [create_build_env_document(index, environment_size=DOCUMENT_SIZES[size]) for index in range(count)]
+    for document in documents:
+        # the files written by extractBuildEnvInfo -json, the _id is added before the insert
+        del document["_id"]
+    return documents
+
+
+def bench_get_size(repeat: int, count: int = 100000) -> dict:
+    generator = random.Random(0)
+    values = [generator.randint(0, 1024 ** 4) for _ in range(count)]
+    return {"get_size": measure(lambda _: [get_size(value) for value in values], count, repeat)}
+
+
+def bench_document_checks(documents: list, repeat: int) -> dict:
+    def check_documents(copies):
+        for document in copies:
+            check_schema_version(check_id(document))
+
+    return measure(check_documents, len(documents), repeat, setup=lambda: [dict(document) for document in documents])
+
+
+def bench_json_files(documents: list, repeat: int, working_directory: str) -> dict:
+    results = {"create_json_file": measure(lambda _: create_json_file(working_directory, "documents.json", documents),
+                                           len(documents), repeat)}
+    results["load_data"] = measure(lambda _: load_data(working_directory, "documents.json"), len(documents), repeat)
+    return results
+
+
+def bench_send_json2mongo(documents: list, repeat: int, working_directory: str, connection_string: str = None,
+                          use_async: bool = False) -> dict:
+    """
+    Send the documents with the bulk mode of sendJson2Mongo
+    Without a connection string the documents go to an in-process fake of the collection.
+    """
+    send_directory = os.path.join(working_directory, "send")
+    os.makedirs(send_directory, exist_ok=True)
+    for index in range(SEND_FILE_COUNT):
+        append_json_lines(send_directory, f"documents_{index}.json", documents[index::SEND_FILE_COUNT])
+    arguments = ["-conn", connection_string or "mongodb://fake", "-db", "benchmark", "-cn", "build_env_info",
+                 "-json-directory", send_directory, "-w", working_directory]
+    if use_async:
+        arguments.append("--async")
+    args = sendJson2Mongo.create_argumentparser("sendJson2Mongo").parse_args(arguments)
+    logger = logging.getLogger("bench_hot_paths")
+
+    def create_client():
+        if connection_string is None:
+            return FakeClient()
+        client = sendJson2Mongo.create_connection_to_mongodb(connection_string, shared=True)
+        client["benchmark"].drop_collection("build_env_info")
+        return client
+
+    def send(client):
+        with patch.object(sendJson2Mongo, "create_connection_to_mongodb", return_value=client):
+            sendJson2Mongo.send_files(args, logger)
+
+    try:
+        return measure(send, len(documents), repeat, setup=create_client)
+    finally:
+        for index in range(SEND_FILE_COUNT):
+            os.remove(os.path.join(send_directory, f"documents_{index}.json"))
+
+
+def bench_collectors(repeat: int) -> dict:
+    logger = logging.getLogger("bench_hot_paths")
+    results = {}
+    for name, (_, collector) in COLLECTORS.items():
+        results[f"collector/{name}"] = measure(lambda _: collector(logger), 1, repeat)
+    return results
+
+
+def run_benchmarks(sizes: list, counts: list, repeat: int, collector_repeat: int, connection_string: str = None,
+                   with_collectors: bool = True) -> dict:
+    results = bench_get_size(repeat)
+    with tempfile.TemporaryDirectory() as working_directory:
+        for size in sizes:
+            for count in counts:
+                documents = create_documents(size, count)
+                suffix = f"{size}/{count}"
+                results[f"check_id_schema_version/{suffix}"] = bench_document_checks(documents, repeat)
+                for name, result in bench_json_files(documents, repeat, working_directory).items():
+                    results[f"{name}/{suffix}"] = result
+                for use_async in [False, True]:
+                    name = "sendJson2Mongo_async" if use_async else "sendJson2Mongo"
+                    results[f"{name}/{suffix}"] = bench_send_json2mongo(documents, repeat, working_directory,
+                                                                        connection_string, use_async)
+    if with_collectors:
+        results.update(bench_collectors(collector_repeat))
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "metadata": {"created": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                     "platform": platform.platform(), "node": platform.node(),
+                     "mongo": "mongod" if connection_string else "fake"},
+        "results": results,
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Compare the throughput of the benchmarks both runs have in common
+    A benchmark whose operations per second dropped by more than the threshold (e.g. 0.1 for 10%) is a regression.
+    """
+    comparisons = []
+    for name, baseline_result in baseline["results"].items():
+        current_result = current["results"].get(name)
+        if current_result is None:
+            continue
+        change = current_result["operations_per_second"] / baseline_result["operations_per_second"] - 1
+        comparisons.append({"name": name, "baseline": baseline_result["operations_per_second"],
+                            "current": current_result["operations_per_second"], "change": change,
+                            "is_regression": change < -threshold})
+    return comparisons
+
+
+def print_results(results: dict):
+    print(f"{'benchmark':<44}{'operations':>12}{'seconds':>12}{'ops/s':>16}")
+    for name, result in results["results"].items():
+        print(f"{name:<44}{result['operations']:>12}{result['seconds']:>12.4f}"
+              f"{result['operations_per_second']:>16.1f}")
+
+
+def print_comparisons(comparisons: list):
+    print(f"{'benchmark':<44}{'baseline ops/s':>16}{'current ops/s':>16}{'change':>10}")
+    for comparison in comparisons:
+        print(f"{comparison['name']:<44}{comparison['baseline']:>16.1f}{comparison['current']:>16.1f}"
+              f"{comparison['change']:>+10.1%}{'  REGRESSION' if comparison['is_regression'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the ingestion and collection hot paths of pylibcklb")
+    parser.add_argument("--sizes", nargs="+", choices=list(DOCUMENT_SIZES), default=list(DOCUMENT_SIZES))
+    parser.add_argument("--counts", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--collector-repeat", type=int, default=1,
+                        help="The cpu collector alone samples the usage for one second")
+    parser.add_argument("--no-collectors", action="store_false", dest="with_collectors")
+    parser.add_argument("--connection-string", default=None,
+                        help="Send to a local mongod instead of the in-process fake, the benchmark database is dropped")
+    parser.add_argument("--output", help="Write the results as json file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running the benchmarks")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative throughput drop that counts as regression")
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        with open(arguments.compare[0]) as baseline_file, open(arguments.compare[1]) as current_file:
+            comparisons = compare_results(json.load(baseline_file), json.load(current_file), arguments.threshold)
+        print_comparisons(comparisons)
+        if any(comparison["is_regression"] for comparison in comparisons):
+            raise SystemExit(1)
+        return
+
+    results = run_benchmarks(arguments.sizes, arguments.counts, arguments.repeat, arguments.collector_repeat,
+                             arguments.connection_string, arguments.with_collectors)
+    print_results(results)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
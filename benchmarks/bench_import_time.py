@@ -0,0 +1,48 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from pylibcklb.scripts import SCRIPT_MODULES, HEAVY_MODULES
+
+
+def measure_import_time(module: str, repeat: int = 5) -> dict:
+    """
+    Import the module in a fresh interpreter with -X importtime
+    Returns the fastest cumulative import time in milliseconds and the heavy modules that were loaded.
+    """
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    import_times_ms = []
+    loaded_heavy_modules = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                                 check=True, env=environment)
+        for line in process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            values = line.split("|")
+            if len(values) == 3 and values[2].strip() == module:
+                import_times_ms.append(int(values[1]) / 1000)
+        loaded_heavy_modules = [name for name in process.stdout.strip().split(",") if name]
+    return {"import_time_ms": min(import_times_ms), "heavy_modules": loaded_heavy_modules}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the pylibcklb command line scripts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    arguments = parser.parse_args()
+
+    is_over_budget = False
+    print(f"{'module':<42}{'import ms':>12}  heavy modules")
+    for module in SCRIPT_MODULES:
+        result = measure_import_time(module, arguments.repeat)
+        is_over_budget |= result["import_time_ms"] > arguments.budget_ms or bool(result["heavy_modules"])
+        print(f"{module:<42}{result['import_time_ms']:>12.1f}  {', '.join(result['heavy_modules']) or '-'}")
+    if is_over_budget:
+        print(f"Over the budget of {arguments.budget_ms} ms or heavy modules imported")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
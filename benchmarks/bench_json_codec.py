@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from documents import create_build_env_document  # noqa: E402
+from pylibcklb.json.common import JSON_BACKENDS, HAS_ORJSON, decode_json, encode_json  # noqa: E402
+
+
+def run_benchmark(document_count: int, repeat: int, extended_json: bool) -> dict:
+    documents = [create_build_env_document(index) for index in range(document_count)]
+    if not extended_json:
+        # the files written by extractBuildEnvInfo -json, the _id and the dates are added before the insert
+        for document in documents:
+            del document["_id"]
+            del document["created"]
+    texts = [encode_json(document, "bson") for document in documents]
+    results = {}
+    for backend in JSON_BACKENDS:
+        if backend == "orjson" and not HAS_ORJSON:
+            continue
+        decode_seconds = min(timeit.repeat(lambda: [decode_json(text, backend) for text in texts],
+                                           number=1, repeat=repeat))
+        encode_seconds = min(timeit.repeat(lambda: [encode_json(document, backend) for document in documents],
+                                           number=1, repeat=repeat))
+        results[backend] = {"decode_documents_per_second": document_count / decode_seconds,
+                            "encode_documents_per_second": document_count / encode_seconds}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the json backends of pylibcklb.json.common")
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    for extended_json in [False, True]:
+        results = run_benchmark(arguments.documents, arguments.repeat, extended_json)
+        reference = results["bson"]
+        print(f"Build environment documents {'with' if extended_json else 'without'} Extended JSON values")
+        print(f"{'backend':<10}{'decode docs/s':>16}{'speedup':>10}{'encode docs/s':>16}{'speedup':>10}")
+        for backend, result in results.items():
+            print(f"{backend:<10}"
+                  f"{result['decode_documents_per_second']:>16.0f}"
+                  f"{result['decode_documents_per_second'] / reference['decode_documents_per_second']:>9.1f}x"
+                  f"{result['encode_documents_per_second']:>16.0f}"
+                  f"{result['encode_documents_per_second'] / reference['encode_documents_per_second']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
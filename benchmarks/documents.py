@@ -0,0 +1,40 @@
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+
+def create_build_env_document(index: int = 0, cores: int = 16, environment_size: int = 80) -> dict:
+    # the shape of the documents written by extractBuildEnvInfo -esi
+    generator = random.Random(index)
+    cpu_information = {"cores_physical": cores // 2, "cores_total": cores, "frequency_max": "3600.00Mhz",
+                       "frequency_min": "800.00Mhz", "frequency_current": f"{generator.uniform(800, 3600):.2f}Mhz"}
+    for core in range(cores):
+        cpu_information[f"core_usage_{core}"] = f"{generator.uniform(0, 100):.1f}%"
+    cpu_information["core_usage_all"] = f"{generator.uniform(0, 100):.1f}%"
+    return {
+        "_id": ObjectId(),
+        "schema_version": 1,
+        "created": datetime(2022, 9, 11) + timedelta(seconds=index),
+        "system_information": {
+            "system": "Linux", "node_name": f"build-agent-{index % 32}", "release": "5.15.0-48-generic",
+            "version": "#54-Ubuntu SMP", "machine": "x86_64", "processor": "x86_64",
+            "processor_raw": "AMD EPYC 7B13", "ip_address": f"10.0.{index % 256}.{generator.randint(1, 254)}",
+            "mac_address": "42:01:0a:00:00:02", "boot_time": "2022/9/11 8:0:0", "boot_time_sec": 1662883200.0,
+            "cpu": cpu_information,
+            "memory": {"total": "62.80GB", "available": "48.12GB", "used": "13.42GB", "percentage": "23.4%",
+                       "swap": {"total": "0.00B", "free": "0.00B", "used": "0.00B", "percentage": "0.0%"}},
+            "disk": {"partitions": [{"device": f"/dev/sda{partition}", "mountpoint": f"/mnt/{partition}",
+                                     "fstype": "ext4", "total_size": "195.80GB", "used": "87.01GB",
+                                     "free": "108.79GB", "percentage": "44.4%"} for partition in range(4)],
+                     "total_read": "12.41GB", "total_write": "30.02GB"},
+            "network": {"interfaces": [{"name": f"eth{interface}", "address.family": "AddressFamily.AF_INET",
+                                        "ip_address": f"10.0.0.{interface}", "netmask": "255.255.255.0",
+                                        "broadcast_ip": None} for interface in range(3)],
+                        "bytes_sent": "1.20GB", "bytes_received": "8.43GB"},
+            "environment_parameter": [{f"VARIABLE_{variable}": f"value-{generator.random()}"}
+                                      for variable in range(environment_size)],
+            "software": [],
+        },
+        "workspace_information": {},
+    }
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def encode_document(document) -> bytes:
+    # the documents are encoded like the driver does it before they are sent, so the benchmarks include that cost
+    if isinstance(document, RawBSONDocument):
+        return document.raw
+    return bson.encode(document)
+
+
+class FakeCollection:
+    """
+    In-process stand-in for the parts of a pymongo collection the pylibcklb scripts use
+    The documents are stored as encoded bson by _id.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents = {}
+
+    def insert_one(self, document):
+        if "_id" not in document:
+            document["_id"] = bson.ObjectId()
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error _id {document['_id']}", DUPLICATE_KEY_ERROR)
+        self.documents[document["_id"]] = encode_document(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def insert_many(self, documents, ordered: bool = True):
+        write_errors = []
+        inserted = 0
+        for index, document in enumerate(documents):
+            try:
+                self.insert_one(document)
+                inserted += 1
+            except DuplicateKeyError as error:
+                write_errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(error),
+                                     "op": document})
+                if ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": inserted, "nMatched": 0,
+                                  "nModified": 0, "nUpserted": 0})
+        return SimpleNamespace(inserted_count=inserted)
+
+    def replace_one(self, filter: dict, replacement, upsert: bool = False):
+        document_id = filter["_id"]
+        is_matched = document_id in self.documents
+        if is_matched or upsert:
+            if not isinstance(replacement, RawBSONDocument):
+                replacement = dict(replacement, _id=document_id)
+            self.documents[document_id] = encode_document(replacement)
+        return SimpleNamespace(matched_count=int(is_matched), modified_count=int(is_matched),
+                               upserted_id=document_id if upsert and not is_matched else None)
+
+    def bulk_write(self, requests, ordered: bool = True):
+        matched = 0
+        upserted = 0
+        for request in requests:
+            # only ReplaceOne requests are written by run_bulk_replacement_on_collection
+            result = self.replace_one(request._filter, request._doc, request._upsert)
+            matched += result.matched_count
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_count=upserted)
+
+    def find(self, filter: dict = None):
+        return (bson.decode(raw) for raw in self.documents.values())
+
+    def count_documents(self, filter: dict) -> int:
+        return len(self.documents)
+
+
+class FakeDatabase(dict):
+
+    def __missing__(self, collection_name: str) -> FakeCollection:
+        collection = self[collection_name] = FakeCollection(collection_name)
+        return collection
+
+
+class FakeClient(dict):
+
+    def __missing__(self, database_name: str) -> FakeDatabase:
+        database = self[database_name] = FakeDatabase()
+        return database
+
+    def close(self):
+        pass
@@ -0,0 +1,139 @@
+import re
+from datetime import datetime, timezone
+
+from pylibcklb.calculation.common import get_size, parse_size, format_percentage, parse_percentage, \
+    format_frequency, parse_frequency
+
+# schema_version 1 stores every metric as formatted string and one core_usage_N key per core, schema_version 2
+# stores the raw numbers (bytes, Mhz, percent) with the same keys and the core usages as array
+SCHEMA_VERSION = 2
+CORE_USAGE_KEY = re.compile(r"core_usage_(\d+)")
+CPU_FIELDS = {"frequency_max": "frequency", "frequency_min": "frequency", "frequency_current": "frequency",
+              "core_usage_all": "percentage"}
+MEMORY_FIELDS = {"total": "size", "available": "size", "free": "size", "used": "size", "percentage": "percentage"}
+PARTITION_FIELDS = {"total_size": "size", "used": "size", "free": "size", "percentage": "percentage"}
+DISK_FIELDS = {"total_read": "size", "total_write": "size"}
+NETWORK_FIELDS = {"bytes_sent": "size", "bytes_received": "size"}
+WORKSPACE_FIELDS = {"total_size": "size", "size": "size"}
+FORMATTERS = {"size": get_size, "frequency": format_frequency, "percentage": format_percentage}
+PARSERS = {"size": parse_size, "frequency": parse_frequency, "percentage": parse_percentage}
+
+
+def convert_fields(information: dict, fields: dict, converters: dict) -> dict:
+    return {key: converters[fields[key]](value) if key in fields and value is not None else value
+            for key, value in information.items()}
+
+
+def format_boot_time(boot_time_sec: float) -> str:
+    bt = datetime.fromtimestamp(boot_time_sec)
+    return f"{bt.year}/{bt.month}/{bt.day} {bt.hour}:{bt.minute}:{bt.second}"
+
+
+def render_cpu_information(cpu_information: dict) -> dict:
+    rendered = {}
+    for key, value in convert_fields(cpu_information, CPU_FIELDS, FORMATTERS).items():
+        if key == "core_usage":
+            for i, percentage in enumerate(value):
+                rendered[f"core_usage_{i}"] = format_percentage(percentage)
+        else:
+            rendered[key] = value
+    return rendered
+
+
+def migrate_cpu_information(cpu_information: dict) -> dict:
+    migrated = {}
+    core_usages = {}
+    for key, value in convert_fields(cpu_information, CPU_FIELDS, PARSERS).items():
+        match = CORE_USAGE_KEY.fullmatch(key)
+        if match is None:
+            migrated[key] = value
+            continue
+        if not core_usages:
+            # the array takes the place of the first core
+            migrated["core_usage"] = None
+        core_usages[int(match.group(1))] = parse_percentage(value)
+    if core_usages:
+        migrated["core_usage"] = [core_usages[i] for i in sorted(core_usages)]
+    return migrated
+
+
+def convert_memory_information(memory_information: dict, converters: dict) -> dict:
+    converted = convert_fields(memory_information, MEMORY_FIELDS, converters)
+    if isinstance(converted.get("swap"), dict):
+        converted["swap"] = convert_fields(converted["swap"], MEMORY_FIELDS, converters)
+    return converted
+
+
+def convert_disk_information(disk_information: dict, converters: dict) -> dict:
+    converted = convert_fields(disk_information, DISK_FIELDS, converters)
+    if isinstance(converted.get("partitions"), list):
+        converted["partitions"] = [convert_fields(partition, PARTITION_FIELDS, converters)
+                                   for partition in converted["partitions"]]
+    return converted
+
+
+def render_system_information(system_information: dict) -> dict:
+    """
+    Render the raw numbers of schema_version 2 as the formatted strings of schema_version 1
+    """
+    rendered = dict(system_information)
+    if isinstance(rendered.get("boot_time"), datetime) and "boot_time_sec" in rendered:
+        rendered["boot_time"] = format_boot_time(rendered["boot_time_sec"])
+    if isinstance(rendered.get("cpu"), dict):
+        rendered["cpu"] = render_cpu_information(rendered["cpu"])
+    if isinstance(rendered.get("memory"), dict):
+        rendered["memory"] = convert_memory_information(rendered["memory"], FORMATTERS)
+    if isinstance(rendered.get("disk"), dict):
+        rendered["disk"] = convert_disk_information(rendered["disk"], FORMATTERS)
+    if isinstance(rendered.get("network"), dict):
+        rendered["network"] = convert_fields(rendered["network"], NETWORK_FIELDS, FORMATTERS)
+    return rendered
+
+
+def migrate_system_information(system_information: dict) -> dict:
+    """
+    Parse the formatted strings of schema_version 1 into the raw numbers of schema_version 2
+    The sizes are only as exact as the two decimals schema_version 1 has stored.
+    """
+    migrated = dict(system_information)
+    if isinstance(migrated.get("boot_time"), str) and "boot_time_sec" in migrated:
+        migrated["boot_time"] = datetime.fromtimestamp(migrated["boot_time_sec"], timezone.utc)
+    if isinstance(migrated.get("cpu"), dict):
+        migrated["cpu"] = migrate_cpu_information(migrated["cpu"])
+    if isinstance(migrated.get("memory"), dict):
+        migrated["memory"] = convert_memory_information(migrated["memory"], PARSERS)
+    if isinstance(migrated.get("disk"), dict):
+        migrated["disk"] = convert_disk_information(migrated["disk"], PARSERS)
+    if isinstance(migrated.get("network"), dict):
+        migrated["network"] = convert_fields(migrated["network"], NETWORK_FIELDS, PARSERS)
+    return migrated
+
+
+def render_workspace_information(workspace_information: dict) -> dict:
+    rendered = convert_fields(workspace_information, WORKSPACE_FIELDS, FORMATTERS)
+    for key in ["largest_files", "top_level"]:
+        if isinstance(rendered.get(key), list):
+            rendered[key] = [convert_fields(entry, WORKSPACE_FIELDS, FORMATTERS) for entry in rendered[key]]
+    return rendered
+
+
+def render_human_readable(document: dict) -> dict:
+    rendered = dict(document)
+    if isinstance(rendered.get("system_information"), dict):
+        rendered["system_information"] = render_system_information(rendered["system_information"])
+    if isinstance(rendered.get("workspace_information"), dict):
+        rendered["workspace_information"] = render_workspace_information(rendered["workspace_information"])
+    if "schema_version" in rendered:
+        rendered["schema_version"] = 1
+    return rendered
+
+
+def migrate_document(document: dict) -> dict:
+    # documents of schema_version 2 are returned unchanged, so a migration can be repeated
+    if int(document.get("schema_version", 1)) != 1:
+        return document
+    migrated = dict(document)
+    if isinstance(migrated.get("system_information"), dict):
+        migrated["system_information"] = migrate_system_information(migrated["system_information"])
+    migrated["schema_version"] = SCHEMA_VERSION
+    return migrated
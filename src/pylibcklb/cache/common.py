@@ -0,0 +1,36 @@
+import os
+import sys
+
+from pylibcklb.json.common import load_data, write_json_file
+
+
+def get_cache_directory(application_name: str = "pylibcklb") -> str:
+    if sys.platform == "win32":  # pragma: no cover
+        base_directory = os.getenv("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base_directory = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base_directory, application_name)
+
+
+def load_cache(cache_file: str, cache_key):
+    # returns None if there is no cache file, it can not be read or it was written for another key
+    try:
+        cache = load_data(os.path.dirname(cache_file), os.path.basename(cache_file))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get("key") != cache_key:
+        return None
+    return cache.get("value")
+
+
+def store_cache(cache_file: str, cache_key, value):
+    cache_directory = os.path.dirname(os.path.abspath(cache_file))
+    os.makedirs(cache_directory, exist_ok=True)
+    write_json_file(cache_directory, os.path.basename(cache_file), {"key": cache_key, "value": value})
+
+
+def invalidate_cache(cache_file: str):
+    try:
+        os.remove(cache_file)
+    except FileNotFoundError:
+        pass
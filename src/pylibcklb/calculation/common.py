@@ -1,3 +1,8 @@
+import re
+
+SIZE_UNITS = ["", "K", "M", "G", "T"]
+
+
 def get_size(bytes_in, suffix="B") -> str:
     """
     Scale bytes to its proper format
@@ -6,7 +11,62 @@ def get_size(bytes_in, suffix="B") -> str:
         1253656678 => '1.17GB'
     """
     factor = 1024
-    for unit in ["", "K", "M", "G", "T"]:
+    for unit in SIZE_UNITS:
         if bytes_in < factor:
             return f"{bytes_in:.2f}{unit}{suffix}"
         bytes_in /= factor
+
+
+def parse_size(size: str, suffix="B"):
+    """
+    Convert the output of get_size back to bytes
+    e.g:
+        '1.20MB' => 1258291
+    The value is only as exact as the two decimals of get_size
+    """
+    if size is None or isinstance(size, (int, float)):
+        return size
+    if size == "None":
+        # get_size returns None for sizes above its largest unit
+        return None
+    match = re.fullmatch(rf"\s*([0-9.]+)\s*({'|'.join(SIZE_UNITS[1:])})?{suffix}\s*", size)
+    if match is None:
+        raise ValueError(f"Invalid size {size}")
+    return round(float(match.group(1)) * 1024 ** SIZE_UNITS.index(match.group(2) or ""))
+
+
+def parse_number(value: str, suffix: str):
+    # e.g. '37.5%' => 37.5 or '2400.00Mhz' => 2400.0
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if not value.endswith(suffix):
+        raise ValueError(f"Invalid value {value}, expected the suffix {suffix}")
+    return float(value[:-len(suffix)])
+
+
+def parse_percentage(percentage: str):
+    return parse_number(percentage, "%")
+
+
+def format_percentage(percentage: float) -> str:
+    return f"{percentage}%"
+
+
+def parse_frequency(frequency: str):
+    return parse_number(frequency, "Mhz")
+
+
+def format_frequency(frequency: float) -> str:
+    return f"{frequency:.2f}Mhz"
+
+
+def calculate_rates(previous_counters: dict, current_counters: dict, interval_sec: float) -> dict:
+    """
+    Calculate the per second rates of monotonic counters between two samples
+    A counter that went backwards (e.g. reset of a network interface) has the rate 0
+    """
+    rates = {}
+    for key, current_value in current_counters.items():
+        if key in previous_counters:
+            rates[key] = max(current_value - previous_counters[key], 0) / interval_sec if interval_sec > 0 else 0.0
+    return rates
@@ -0,0 +1,268 @@
+import importlib.util
+import math
+
+# numpy is optional, the batch updates fall back to a loop over the values
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+class RunningStatistics:
+    """
+    Count, mean, variance, minimum and maximum of a stream of values in constant memory (Welford)
+    Two instances are merged with the parallel algorithm of Chan et al., e.g. the statistics of several agents.
+    """
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # sum of the squared differences from the mean
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def update_batch(self, values):
+        if not HAS_NUMPY:
+            for value in values:
+                self.update(value)
+            return
+        import numpy
+
+        array = numpy.asarray(values, dtype=float)
+        if array.size == 0:
+            return
+        batch = RunningStatistics()
+        batch.count = int(array.size)
+        batch.mean = float(array.mean())
+        batch.m2 = float(numpy.square(array - batch.mean).sum())
+        batch.minimum = float(array.min())
+        batch.maximum = float(array.max())
+        self.merge(batch)
+
+    def merge(self, other: "RunningStatistics") -> "RunningStatistics":
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def variance(self) -> float:
+        # population variance
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def standard_deviation(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "minimum": self.minimum,
+                "maximum": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStatistics":
+        statistics = cls()
+        statistics.count = data["count"]
+        statistics.mean = data["mean"]
+        statistics.m2 = data["m2"]
+        statistics.minimum = data["minimum"]
+        statistics.maximum = data["maximum"]
+        return statistics
+
+
+class LogHistogram:
+    """
+    Quantile sketch with logarithmic buckets, every quantile is within the relative accuracy of the exact value
+    Values up to the zero threshold (e.g. an idle cpu) are counted in an own bucket. The buckets only depend on the
+    relative accuracy, so sketches with the same accuracy are merged by adding the bucket counts, on the client with
+    merge or in the mongodb with the update document of to_update.
+    """
+    __slots__ = ("relative_accuracy", "zero_threshold", "log_gamma", "count", "zero_count", "bins", "minimum",
+                 "maximum")
+
+    def __init__(self, relative_accuracy: float = 0.01, zero_threshold: float = 1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"Invalid relative accuracy {relative_accuracy}, expected a value between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.zero_threshold = zero_threshold
+        self.log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.count = 0
+        self.zero_count = 0
+        # bucket index => count, the bucket i holds the values in (gamma^(i-1), gamma^i]
+        self.bins = {}
+        self.minimum = None
+        self.maximum = None
+
+    def get_bucket_index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def get_bucket_value(self, index: int) -> float:
+        # the value with the same relative distance to both bucket bounds
+        gamma = math.exp(self.log_gamma)
+        return 2 * gamma ** index / (gamma + 1)
+
+    def update(self, value: float):
+        if value < 0:
+            raise ValueError(f"Invalid value {value}, negative values are not supported")
+        if value <= self.zero_threshold:
+            self.zero_count += 1
+        else:
+            index = self.get_bucket_index(value)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def update_batch(self, values):
+        if not HAS_NUMPY:
+            for value in values:
+                self.update(value)
+            return
+        import numpy
+
+        array = numpy.asarray(values, dtype=float)
+        if array.size == 0:
+            return
+        if (array < 0).any():
+            raise ValueError("Invalid values, negative values are not supported")
+        is_zero = array <= self.zero_threshold
+        indices = numpy.ceil(numpy.log(array[~is_zero]) / self.log_gamma).astype(numpy.int64)
+        for index, count in zip(*(part.tolist() for part in numpy.unique(indices, return_counts=True))):
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += int(is_zero.sum())
+        self.count += int(array.size)
+        minimum = float(array.min())
+        maximum = float(array.max())
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def quantile(self, q: float):
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantile {q}, expected a value between 0 and 1")
+        if self.count == 0:
+            return None
+        # the exact minimum and maximum are known, the estimates never leave them
+        if q == 0:
+            return self.minimum
+        if q == 1:
+            return self.maximum
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return self.minimum
+        cumulative_count = self.zero_count
+        for index in sorted(self.bins):
+            cumulative_count += self.bins[index]
+            if cumulative_count > rank:
+                return min(max(self.get_bucket_value(index), self.minimum), self.maximum)
+        return self.maximum
+
+    def merge(self, other: "LogHistogram") -> "LogHistogram":
+        if other.relative_accuracy != self.relative_accuracy or other.zero_threshold != self.zero_threshold:
+            raise ValueError("Only sketches with the same relative accuracy and zero threshold can be merged")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+        self.zero_count += other.zero_count
+        if other.count:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        return self
+
+    def to_dict(self) -> dict:
+        # the keys of a mongodb document have to be strings
+        return {"relative_accuracy": self.relative_accuracy, "zero_threshold": self.zero_threshold,
+                "count": self.count, "zero_count": self.zero_count,
+                "bins": {str(index): count for index, count in self.bins.items()},
+                "minimum": self.minimum, "maximum": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        histogram = cls(data["relative_accuracy"], data["zero_threshold"])
+        histogram.count = data["count"]
+        histogram.zero_count = data["zero_count"]
+        histogram.bins = {int(index): count for index, count in data["bins"].items()}
+        histogram.minimum = data["minimum"]
+        histogram.maximum = data["maximum"]
+        return histogram
+
+    def to_update(self, field: str) -> dict:
+        """
+        Update document that merges the sketch into the sketch stored in the field of a mongodb document
+        e.g. collection.update_one({"_id": node_name}, histogram.to_update("cpu_usage"), upsert=True)
+        """
+        update = {"$inc": {f"{field}.count": self.count, f"{field}.zero_count": self.zero_count},
+                  "$set": {f"{field}.relative_accuracy": self.relative_accuracy,
+                           f"{field}.zero_threshold": self.zero_threshold}}
+        for index, count in self.bins.items():
+            update["$inc"][f"{field}.bins.{index}"] = count
+        if self.count:
+            update["$min"] = {f"{field}.minimum": self.minimum}
+            update["$max"] = {f"{field}.maximum": self.maximum}
+        return update
+
+
+class ExponentiallyWeightedAverage:
+    """
+    Average in which the weight of a value halves every half life, the values may arrive at irregular times
+    """
+    __slots__ = ("half_life_sec", "value", "timestamp")
+
+    def __init__(self, half_life_sec: float):
+        self.half_life_sec = half_life_sec
+        self.value = None
+        self.timestamp = None
+
+    def update(self, value: float, timestamp: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            elapsed_sec = max(timestamp - self.timestamp, 0)
+            weight = 1 - 0.5 ** (elapsed_sec / self.half_life_sec)
+            self.value += weight * (value - self.value)
+        self.timestamp = timestamp
+        return self.value
+
+
+class ExponentiallyWeightedRate:
+    """
+    Smoothed per second rate of a monotonic counter, e.g. the bytes sent by a network interface
+    A counter that went backwards (e.g. reset of a network interface) has the rate 0 like in calculate_rates.
+    """
+    __slots__ = ("average", "counter", "timestamp")
+
+    def __init__(self, half_life_sec: float):
+        self.average = ExponentiallyWeightedAverage(half_life_sec)
+        self.counter = None
+        self.timestamp = None
+
+    def update(self, counter: float, timestamp: float):
+        if self.counter is not None and timestamp > self.timestamp:
+            rate = max(counter - self.counter, 0) / (timestamp - self.timestamp)
+            self.average.update(rate, timestamp)
+        self.counter = counter
+        self.timestamp = timestamp
+        return self.average.value
+
+    @property
+    def value(self):
+        return self.average.value
@@ -0,0 +1,142 @@
+import re
+from datetime import timezone
+
+try:
+    import git
+    from git import InvalidGitRepositoryError, NoSuchPathError, GitCommandError, GitCommandNotFound
+except ImportError:  # pragma: no cover
+    git = None
+
+    class InvalidGitRepositoryError(Exception):
+        pass
+
+    class NoSuchPathError(OSError):
+        pass
+
+    class GitCommandError(Exception):
+        pass
+
+    class GitCommandNotFound(Exception):
+        pass
+
+GITLINK_MODE = "160000"
+GITMODULES_PATH = re.compile(r"^\s*path\s*=\s*(.+?)\s*$", re.MULTILINE)
+
+
+def parse_status_porcelain_v2(output: str) -> dict:
+    """
+    Parse the output of git status --porcelain=v2 --branch -z
+    see https://git-scm.com/docs/git-status#_porcelain_format_version_2
+    """
+    status = {"commit": None, "branch": None, "is_detached": False, "upstream": None, "ahead": 0, "behind": 0,
+              "staged_files": 0, "changed_files": 0, "unmerged_files": 0, "untracked_files": 0, "submodules": {}}
+    fields = iter(output.split("\0"))
+    for field in fields:
+        if field.startswith("# branch.oid "):
+            oid = field[len("# branch.oid "):]
+            status["commit"] = None if oid == "(initial)" else oid
+        elif field.startswith("# branch.head "):
+            head = field[len("# branch.head "):]
+            status["is_detached"] = head == "(detached)"
+            status["branch"] = None if status["is_detached"] else head
+        elif field.startswith("# branch.upstream "):
+            status["upstream"] = field[len("# branch.upstream "):]
+        elif field.startswith("# branch.ab "):
+            ahead, behind = field[len("# branch.ab "):].split()
+            status["ahead"] = int(ahead)
+            status["behind"] = -int(behind)
+        elif field[:2] in ("1 ", "2 ", "u "):
+            # <type> <XY> <sub> ... <path>, the path is the last of a fixed number of space separated values
+            number_of_values = {"1": 9, "2": 10, "u": 11}[field[0]]
+            values = field.split(" ", number_of_values - 1)
+            index_status, worktree_status = values[1]
+            if field[0] == "u":
+                status["unmerged_files"] += 1
+            else:
+                status["staged_files"] += index_status != "."
+                status["changed_files"] += worktree_status != "."
+            if values[2].startswith("S"):
+                status["submodules"][values[-1]] = {"commit_changed": values[2][1] == "C",
+                                                    "modified": values[2][2] == "M",
+                                                    "untracked": values[2][3] == "U"}
+            if field[0] == "2":
+                # the original path of a rename or copy is the next field
+                next(fields, None)
+        elif field.startswith("? "):
+            status["untracked_files"] += 1
+    return status
+
+
+def parse_ls_tree(output: str) -> dict:
+    # <mode> SP <type> SP <object> TAB <path> NUL
+    entries = {}
+    for entry in output.split("\0"):
+        if entry:
+            information, path = entry.split("\t", 1)
+            mode, _, object_name = information.split()
+            entries[path] = (mode, object_name)
+    return entries
+
+
+def get_submodule_revisions(repository, commit) -> dict:
+    """
+    Get the submodule commits recorded in the commit
+    The .gitmodules blob is read through the persistent cat-file process and all gitlinks are resolved with a
+    single ls-tree instead of one call per submodule.
+    """
+    try:
+        gitmodules = commit.tree[".gitmodules"].data_stream.read().decode("utf-8")
+    except KeyError:
+        return {}
+    paths = GITMODULES_PATH.findall(gitmodules)
+    if not paths:
+        return {}
+    entries = parse_ls_tree(repository.git.ls_tree("-z", commit.hexsha, "--", *paths))
+    return {path: object_name for path, (mode, object_name) in entries.items() if mode == GITLINK_MODE}
+
+
+def get_git_information(path: str, untracked_files: bool = False) -> dict:
+    """
+    Collect commit, branch, dirty state and submodule revisions of the repository that contains the path
+    A fixed number of git calls is used, independent of the number of files and the length of the history:
+    one status, the commit objects through the persistent cat-file process of GitPython and one ls-tree.
+    """
+    if git is None:
+        raise ImportError("The git information needs the GitPython package")
+    repository = git.Repo(path, search_parent_directories=True)
+    try:
+        status = parse_status_porcelain_v2(repository.git.status(
+            "--porcelain=v2", "--branch", "-z", f"--untracked-files={'normal' if untracked_files else 'no'}"))
+        git_information = {
+            "root": repository.working_tree_dir,
+            "commit": status["commit"],
+            "branch": status["branch"],
+            "is_detached": status["is_detached"],
+            "upstream": status["upstream"],
+            "ahead": status["ahead"],
+            "behind": status["behind"],
+            "is_dirty": bool(status["staged_files"] or status["changed_files"] or status["unmerged_files"] or
+                             status["untracked_files"]),
+            "staged_files": status["staged_files"],
+            "changed_files": status["changed_files"],
+            "unmerged_files": status["unmerged_files"],
+        }
+        if untracked_files:
+            git_information["untracked_files"] = status["untracked_files"]
+        submodules = []
+        if status["commit"] is not None:
+            commit = repository.commit(status["commit"])
+            git_information["author"] = commit.author.name
+            git_information["author_date"] = commit.authored_datetime.astimezone(timezone.utc)
+            git_information["committer_date"] = commit.committed_datetime.astimezone(timezone.utc)
+            git_information["summary"] = commit.summary
+            for submodule_path, submodule_commit in get_submodule_revisions(repository, commit).items():
+                submodule = {"path": submodule_path, "commit": submodule_commit}
+                submodule.update(status["submodules"].get(
+                    submodule_path, {"commit_changed": False, "modified": False, "untracked": False}))
+                submodules.append(submodule)
+        git_information["submodules"] = submodules
+    finally:
+        # stops the persistent cat-file processes
+        repository.close()
+    return git_information
@@ -1,14 +1,413 @@
+import collections
+import contextlib
+import gzip
+import importlib.util
+import io
+import json
 import os
 
-# comes from the pymongo include bson
-from bson.json_util import loads, dumps
+from pylibcklb.metrics.common import span, increment
 
+# bson.json_util (comes from the pymongo include bson), orjson and zstandard are imported where they are used,
+# so the command line scripts start without loading them
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+HAS_ZSTANDARD = importlib.util.find_spec("zstandard") is not None
 
-def load_data(working_directory: str, json_filename: str):
-    with open(os.path.join(working_directory, json_filename), 'r') as f:
-        return loads(f.read())
+JSON_BACKENDS = ["orjson", "json", "bson"]
+# orjson is the fastest decoder, the C scanner of the stdlib json module is the fallback and bson.json_util the
+# pure python reference implementation
+JSON_BACKEND = "orjson" if HAS_ORJSON else "json"
+# the keys bson.json_util.object_hook converts, see the MongoDB Extended JSON specification
+EXTENDED_JSON_KEYS = frozenset(["$binary", "$code", "$date", "$dbPointer", "$maxKey", "$minKey", "$numberDecimal",
+                                "$numberDouble", "$numberInt", "$numberLong", "$oid", "$ref", "$regex",
+                                "$regularExpression", "$symbol", "$timestamp", "$undefined", "$uuid"])
+# integers with 19 or more digits may not fit into 64 bit (-9223372036854775809 is below the int64 minimum) and are
+# decoded as float by older orjson versions, the digits are mapped to \x01 to find such a run with a plain substring
+# search
+LONG_NUMBER_DIGITS = 19
+DIGIT_TABLE = bytes(1 if chr(character).isdigit() and character < 128 else 0 for character in range(256))
+DIGIT_TABLE_STR = str.maketrans(dict.fromkeys("0123456789", "\x01"))
+STREAM_CHUNK_SIZE = 1024 * 1024
+# byte range of a newline delimited json file that one decode process loads at once
+PARALLEL_PART_SIZE = 16 * 1024 * 1024
+# containers up to this depth are written piece by piece, deeper values are encoded at once by the C encoder
+STREAM_WRITE_DEPTH = 3
+COMPRESSIONS = ["gzip", "zstd"]
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+WHITESPACE = " \t\n\r"
+# mode of a newly created file, see get_new_file_mode
+_new_file_mode = None
 
 
-def create_json_file(working_directory: str, json_filename: str, content: dict):
-    with open(os.path.join(working_directory, json_filename), 'w') as file:
-        file.write(dumps(content))
+def has_extended_json(data) -> bool:
+    if isinstance(data, str):
+        return '"$' in data or "\\u0024" in data
+    return b'"$' in data or b"\\u0024" in data
+
+
+def has_long_number(data) -> bool:
+    if isinstance(data, str):
+        return "\x01" * LONG_NUMBER_DIGITS in data.translate(DIGIT_TABLE_STR)
+    return b"\x01" * LONG_NUMBER_DIGITS in data.translate(DIGIT_TABLE)
+
+
+def convert_extended_json(value: dict):
+    """
+    Object hook of the json module that converts the Extended JSON values ($oid, $date, $numberLong, ...)
+    The C scanner calls it for every decoded object after its nested objects, like the object_pairs_hook of
+    bson.json_util.loads, only the objects with an Extended JSON key reach bson.json_util.
+    """
+    if EXTENDED_JSON_KEYS.isdisjoint(value):
+        return value
+    from bson import json_util
+
+    return json_util.object_hook(value, json_util.DEFAULT_JSON_OPTIONS)
+
+
+def decode_json(data, backend: str = None):
+    backend = backend or JSON_BACKEND
+    if backend == "bson":
+        from bson import json_util
+
+        return json_util.loads(data)
+    if has_extended_json(data):
+        # orjson has no object hook, walking its result again is slower than converting during the parse
+        return json.loads(data, object_hook=convert_extended_json)
+    if backend == "orjson" and not has_long_number(data):
+        import orjson
+
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects valid input of the json module, e.g. NaN
+            pass
+    return json.loads(data)
+
+
+def default_json_encoding(value):
+    # the same conversion bson.json_util.dumps applies, but only to the values the json module can not encode
+    if hasattr(value, "items"):
+        return dict(value.items())
+    if hasattr(value, "__iter__") and not isinstance(value, (str, bytes)):
+        return list(value)
+    from bson import json_util
+
+    return json_util.default(value, json_util.DEFAULT_JSON_OPTIONS)
+
+
+def encode_json(content, backend: str = None) -> str:
+    backend = backend or JSON_BACKEND
+    if backend != "bson":
+        try:
+            # the C encoder of the json module writes the same text as bson.json_util.dumps
+            return json.dumps(content, default=default_json_encoding, allow_nan=False)
+        except ValueError:
+            # NaN and Infinity are written as $numberDouble by bson.json_util
+            pass
+    from bson import json_util
+
+    return json_util.dumps(content)
+
+
+def load_data(working_directory: str, json_filename: str, backend: str = None):
+    with span("read_file"):
+        with open(os.path.join(working_directory, json_filename), 'rb') as f:
+            data = f.read()
+    increment("bytes_read", len(data))
+    with span("decode_json"):
+        return decode_json(data, backend)
+
+
+def create_json_file(working_directory: str, json_filename: str, content: dict, backend: str = None):
+    with span("encode_json"):
+        text = encode_json(content, backend)
+    with span("write_file"):
+        with open(os.path.join(working_directory, json_filename), 'w') as file:
+            increment("bytes_written", file.write(text))
+
+
+def iterate_json_chunks(content, depth: int = STREAM_WRITE_DEPTH):
+    # yields the same text as encode_json, but never holds more than one value below the depth in memory
+    if depth > 0 and hasattr(content, "items") and all(isinstance(key, str) for key in content.keys()):
+        yield "{"
+        for index, (key, value) in enumerate(content.items()):
+            yield f"{', ' if index else ''}{json.dumps(key)}: "
+            yield from iterate_json_chunks(value, depth - 1)
+        yield "}"
+    elif depth > 0 and isinstance(content, (list, tuple)):
+        yield "["
+        for index, value in enumerate(content):
+            if index:
+                yield ", "
+            yield from iterate_json_chunks(value, depth - 1)
+        yield "]"
+    else:
+        yield encode_json(content)
+
+
+def check_compression(compression: str):
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression}, supported are {', '.join(COMPRESSIONS)}")
+    if compression == "zstd" and not HAS_ZSTANDARD:
+        raise ImportError("The zstd compression needs the zstandard package")
+
+
+def compress_data(data: bytes, compression: str = None) -> bytes:
+    # a complete gzip member or zstd frame, concatenated members and frames are valid files
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def append_json_lines(working_directory: str, json_filename: str, documents: list, compression: str = None):
+    check_compression(compression)
+    lines = compress_data("".join(encode_json(document) + "\n" for document in documents).encode("utf-8"),
+                          compression)
+    # one write call, so concurrent writers do not interleave their lines
+    with span("write_file"):
+        with open(os.path.join(working_directory, json_filename), 'ab') as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+    increment("bytes_written", len(lines))
+
+
+def get_new_file_mode() -> int:
+    # the mode open gives a new file, the umask can only be read by setting it, so it is read once
+    global _new_file_mode
+    if _new_file_mode is None:
+        umask = os.umask(0o022)
+        os.umask(umask)
+        _new_file_mode = 0o666 & ~umask
+    return _new_file_mode
+
+
+@contextlib.contextmanager
+def open_atomically(path: str, mode: str = 'wb'):
+    """
+    Open a temporary file next to the path, it replaces the path in one step when the block finishes
+    A reader never sees a partly written file. mkstemp creates the file with 0600, it gets the mode of a file
+    created by open instead, so e.g. a node exporter of another user can read it.
+    """
+    import tempfile
+
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                                       prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        os.chmod(temporary_path, get_new_file_mode())
+        with open(file_descriptor, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def write_json_file(working_directory: str, json_filename: str, content, compression: str = None,
+                    append: bool = False):
+    """
+    Write the content as json file without building the whole text in memory
+    The file is replaced atomically via a temporary file. With append the content is added as one line of a
+    newline delimited json file, every line is a complete gzip member or zstd frame when compressed.
+    """
+    check_compression(compression)
+    if append:
+        append_json_lines(working_directory, json_filename, [content], compression)
+        return
+
+    path = os.path.join(working_directory, json_filename)
+    with span("write_file"):
+        with open_atomically(path) as file:
+            if compression == "gzip":
+                stream = gzip.GzipFile(filename="", mode='wb', fileobj=file)
+            elif compression == "zstd":
+                import zstandard
+
+                stream = zstandard.ZstdCompressor().stream_writer(file, closefd=False)
+            else:
+                stream = file
+            text_stream = io.TextIOWrapper(stream, encoding="utf-8")
+            for chunk in iterate_json_chunks(content):
+                text_stream.write(chunk)
+            if stream is file:
+                text_stream.flush()
+                text_stream.detach()
+            else:
+                # closes the compressor only, the file stays open
+                text_stream.close()
+    increment("bytes_written", os.path.getsize(path))
+
+
+def open_json_input(path: str):
+    compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if compression == "gzip":
+        return gzip.open(path, 'rt', encoding="utf-8")
+    if compression == "zstd":
+        check_compression(compression)
+        import zstandard
+
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True),
+                                encoding="utf-8")
+    return open(path, 'r')
+
+
+def iterate_data(working_directory: str, json_filename: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield the documents of a json file one by one without loading the whole file
+    Supported are newline delimited (or concatenated) json documents and a top-level json array, also gzip or zstd
+    compressed with the file extension .gz or .zst
+    """
+    with open_json_input(os.path.join(working_directory, json_filename)) as f:
+        yield from iterate_stream_documents(f, chunk_size)
+
+
+def iterate_stream_documents(f, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield the documents of an open text stream, see iterate_data
+    """
+    decoder = json.JSONDecoder(object_hook=convert_extended_json)
+    buffer = ""
+    position = 0
+    is_end_of_file = False
+    is_array = None
+    read_size = chunk_size
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        if is_array is None and position < len(buffer):
+            is_array = buffer[position] == "["
+            if is_array:
+                position += 1
+            continue
+        if is_array and position < len(buffer) and buffer[position] in ",]":
+            if buffer[position] == "]":
+                return
+            position += 1
+            continue
+        if position < len(buffer):
+            with span("decode_json"):
+                try:
+                    document, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if is_end_of_file:
+                        raise
+                    end = None
+            # a value that ends exactly at the buffer end (e.g. a number) could continue in the next chunk
+            if end is not None and (end < len(buffer) or is_end_of_file):
+                increment("documents_decoded")
+                yield document
+                position = end
+                read_size = chunk_size
+                continue
+        elif is_end_of_file:
+            if is_array:
+                raise json.JSONDecodeError("Unterminated array", buffer, position)
+            return
+        buffer = buffer[position:]
+        position = 0
+        with span("read_file"):
+            chunk = f.read(read_size)
+        is_end_of_file = not chunk
+        buffer += chunk
+        # grow the read size so documents spanning many chunks are not parsed again and again
+        read_size = max(read_size, len(buffer))
+
+
+def load_file_documents(filename: str, adaptation=None) -> list:
+    documents = iterate_data(os.path.dirname(filename), os.path.basename(filename))
+    if adaptation is None:
+        return list(documents)
+    return [adaptation(document) for document in documents]
+
+
+def is_line_delimited(filename: str) -> bool:
+    # the first line has to be a complete document, a pretty printed document or an array can not be split into lines
+    if filename.lower().endswith(tuple(COMPRESSION_EXTENSIONS)):
+        return False
+    with open(filename, 'rb') as f:
+        line = f.readline(STREAM_CHUNK_SIZE).strip()
+    if not line.startswith(b"{"):
+        return False
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+def create_file_parts(filename: str, part_size: int = PARALLEL_PART_SIZE) -> list:
+    """
+    Split a newline delimited json file into byte ranges of about part_size bytes, other files are one part
+    """
+    file_size = os.path.getsize(filename)
+    if file_size <= part_size or not is_line_delimited(filename):
+        return [(filename, 0, None)]
+    return [(filename, start, min(start + part_size, file_size)) for start in range(0, file_size, part_size)]
+
+
+def find_line_start(f, position: int) -> int:
+    # the line that contains the byte before the position belongs to the previous part
+    if position == 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+
+def load_file_part(filename: str, start: int = 0, end: int = None, adaptation=None) -> list:
+    """
+    Decode the documents of the lines that start in the byte range of a file, the whole file without an end
+    """
+    if end is None:
+        return load_file_documents(filename, adaptation)
+    with open(filename, 'rb') as f:
+        start = find_line_start(f, start)
+        end = find_line_start(f, end)
+        if end <= start:
+            return []
+        f.seek(start)
+        with span("read_file"):
+            data = f.read(end - start)
+    documents = iterate_stream_documents(io.StringIO(data.decode("utf-8")))
+    if adaptation is None:
+        return list(documents)
+    return [adaptation(document) for document in documents]
+
+
+def iterate_data_parallel(filenames, adaptation=None, workers: int = None, ordered: bool = True,
+                          part_size: int = PARALLEL_PART_SIZE):
+    """
+    Decode json files on a process pool and yield their documents in the calling process
+    The adaptation is applied inside the workers and has to be a picklable module level function.
+    Newline delimited json files are split into parts of part_size bytes that are decoded in parallel, compressed
+    files, arrays and pretty printed documents are decoded as one part. At most two parts per worker are decoded
+    ahead of the consumer, so the memory is bounded by 2 * workers parts (plus the line that crosses the end of a
+    part) for line delimited files and by 2 * workers whole files for the other ones.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    workers = workers or os.cpu_count()
+    parts = (part for filename in filenames for part in create_file_parts(filename, part_size))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        while True:
+            while len(pending) < 2 * workers:
+                part = next(parts, None)
+                if part is None:
+                    break
+                pending.append(executor.submit(load_file_part, *part, adaptation))
+            if not pending:
+                return
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            yield from future.result()
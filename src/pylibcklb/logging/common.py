@@ -1,22 +1,113 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 
+LOG_FORMATS = ["text", "json"]
+# marks the handlers added by create_logger, so a second call replaces them instead of adding more
+HANDLER_MARKER = "_pylibcklb_handler"
+queue_listeners = {}
 
-def create_logger(application_name: str, default_level=logging.NOTSET):
+
+class LazyMessage:
+    """
+    Message argument that is only built when the record is formatted
+    e.g. logger.info("Total: %s", LazyMessage(get_size, total)) does not call get_size for a disabled level
+    """
+    __slots__ = ("function", "args")
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
+
+
+class PrefixLogger(logging.LoggerAdapter):
+    """
+    Logger that puts a prefix in front of every message
+    e.g. the records of concurrently running collectors are told apart by PrefixLogger(logger, "cpu")
+    """
+
+    def __init__(self, logger, prefix: str):
+        super().__init__(logger, {})
+        self.prefix = prefix
+
+    def process(self, msg, kwargs):
+        return f"[{self.prefix}] {msg}", kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    # one json object per line
+    def format(self, record) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def stop_queue_listener(application_name: str):
+    listener = queue_listeners.pop(application_name, None)
+    if listener is not None:
+        # processes the records that are still queued before it returns
+        listener.stop()
+
+
+def stop_queue_listeners():
+    for application_name in list(queue_listeners):
+        stop_queue_listener(application_name)
+
+
+atexit.register(stop_queue_listeners)
+
+
+def create_logger(application_name: str, default_level=logging.NOTSET, use_queue: bool = False,
+                  log_format: str = "text"):
+    """
+    Create the logger of an application, calling it again replaces the handlers of the previous call
+    With use_queue the records are put into a queue and written by a background thread, so logging does not block
+    on the stream.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {log_format}, supported are {', '.join(LOG_FORMATS)}")
     # create logger
     logger = logging.getLogger(application_name)
     logger.setLevel(default_level)
+    stop_queue_listener(application_name)
+    for handler in [handler for handler in logger.handlers if getattr(handler, HANDLER_MARKER, False)]:
+        logger.removeHandler(handler)
+        handler.close()
 
     # create console handler and set level to debug
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
 
     # create formatter
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
     # add formatter to ch
     ch.setFormatter(formatter)
 
-    # add ch to logger
-    logger.addHandler(ch)
+    if use_queue:
+        handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        listener = logging.handlers.QueueListener(handler.queue, ch, respect_handler_level=True)
+        queue_listeners[application_name] = listener
+        listener.start()
+    else:
+        handler = ch
+    setattr(handler, HANDLER_MARKER, True)
+
+    # add handler to logger
+    logger.addHandler(handler)
 
     return logger
@@ -0,0 +1,151 @@
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+# the instrumentation is process wide and disabled by default, a disabled span or counter is a single flag check
+_enabled = False
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+NULL_SPAN = contextlib.nullcontext()
+PROMETHEUS_PREFIX = "pylibcklb"
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enable_metrics():
+    global _enabled
+    _enabled = True
+
+
+def disable_metrics():
+    global _enabled
+    _enabled = False
+
+
+def is_metrics_enabled() -> bool:
+    return _enabled
+
+
+def reset_metrics():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def span(name: str):
+    """
+    Measure the time of a stage, e.g. with span("load_data"): ...
+    Spans of the same name are summed up, so a span can also wrap every document of a loop.
+    """
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name)
+
+
+def record_span(name: str, seconds: float):
+    # for durations that were already measured, e.g. the collectors of extractBuildEnvInfo
+    if not _enabled:
+        return
+    with _lock:
+        entry = _spans.get(name)
+        if entry is None:
+            entry = _spans[name] = {"count": 0, "seconds": 0.0}
+        entry["count"] += 1
+        entry["seconds"] += seconds
+
+
+def increment(name: str, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_metrics_summary() -> dict:
+    with _lock:
+        return {"spans": {name: dict(entry) for name, entry in _spans.items()}, "counters": dict(_counters)}
+
+
+def write_file_atomically(filename: str, text: str):
+    # the node exporter textfile collector may read the file at any time, so it is replaced in one step
+    from pylibcklb.json.common import open_atomically
+
+    with open_atomically(filename, 'w') as file:
+        file.write(text)
+
+
+def write_metrics_summary(filename: str, summary: dict = None):
+    write_file_atomically(filename, json.dumps(get_metrics_summary() if summary is None else summary, indent=2))
+
+
+def get_prometheus_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def format_prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped_labels = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped_labels.append(f'{get_prometheus_name(key)}="{value}"')
+    return "{" + ",".join(escaped_labels) + "}"
+
+
+def create_prometheus_text(summary: dict, labels: dict = None) -> str:
+    """
+    Format a metrics summary in the Prometheus text exposition format
+    The spans become the stage_seconds_total and stage_calls_total metrics with a stage label, every counter
+    becomes its own <name>_total metric.
+    """
+    labels = labels or {}
+    lines = []
+    if summary["spans"]:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Time spent in the stage")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter")
+        for name, entry in sorted(summary["spans"].items()):
+            stage_labels = format_prometheus_labels(dict(labels, stage=name))
+            lines.append(f"{PROMETHEUS_PREFIX}_stage_seconds_total{stage_labels} {entry['seconds']!r}")
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_stage_calls_total Number of times the stage ran")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter")
+        for name, entry in sorted(summary["spans"].items()):
+            stage_labels = format_prometheus_labels(dict(labels, stage=name))
+            lines.append(f"{PROMETHEUS_PREFIX}_stage_calls_total{stage_labels} {entry['count']}")
+    for name, value in sorted(summary["counters"].items()):
+        metric_name = f"{PROMETHEUS_PREFIX}_{get_prometheus_name(name)}_total"
+        lines.append(f"# TYPE {metric_name} counter")
+        lines.append(f"{metric_name}{format_prometheus_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(filename: str, summary: dict = None, labels: dict = None):
+    write_file_atomically(filename, create_prometheus_text(get_metrics_summary() if summary is None else summary,
+                                                            labels))
+
+
+def export_metrics(summary_filename: str = None, textfile_filename: str = None, labels: dict = None):
+    if summary_filename is None and textfile_filename is None:
+        return
+    summary = get_metrics_summary()
+    if summary_filename:
+        write_metrics_summary(summary_filename, summary)
+    if textfile_filename:
+        write_prometheus_textfile(textfile_filename, summary, labels)
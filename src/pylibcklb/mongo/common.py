@@ -1,13 +1,71 @@
-from bson import ObjectId
-from pymongo import MongoClient
+import atexit
+import hashlib
+import json
+import re
+import threading
+import time
 
+from pylibcklb.json.common import default_json_encoding
+from pylibcklb.metrics.common import span, increment
 
-def check_id(data):
+# pymongo and bson are imported where they are used, so the command line scripts start without loading them
+# shared clients keyed by connection string, every entry holds the client and its pool statistics listener
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+# bson.ObjectId, see get_object_id_class
+_object_id_class = None
+DUPLICATE_KEY_ERROR = 11000
+# write errors that fail again when the operation is sent again: duplicate key, document validation, bad value,
+# type mismatch, unauthorized, immutable field, key too long and document too large
+PERMANENT_ERROR_CODES = frozenset([DUPLICATE_KEY_ERROR, 121, 2, 14, 13, 66, 17280, 10334])
+RETRY_BACKOFF_SEC = 0.1
+MAX_RETRY_BACKOFF_SEC = 5.0
+# batch result key => count of the BulkWriteError details
+BULK_WRITE_COUNTS = (("inserted", "nInserted"), ("matched", "nMatched"), ("modified", "nModified"),
+                     ("upserted", "nUpserted"))
+
+
+def get_field_value(data, field: str):
+    # a dotted path like system_information.node_name, missing fields are None
+    for key in field.split("."):
+        if not hasattr(data, "get"):
+            return None
+        data = data.get(key)
+    return data
+
+
+def get_object_id_class():
+    # check_id runs for every document, the import statement is only executed for the first one
+    global _object_id_class
+    if _object_id_class is None:
+        from bson import ObjectId
+
+        _object_id_class = ObjectId
+    return _object_id_class
+
+
+def create_content_id(data, id_fields: list = None):
+    """
+    Derive the _id from a hash of the canonical json of the document (without its _id) or of the given fields
+    The same content gets the same ObjectId, so sending a file again does not create duplicates. The first bytes of
+    the ObjectId are part of the hash, its generation_time has no meaning.
+    """
+    if id_fields:
+        content = {field: get_field_value(data, field) for field in id_fields}
+    else:
+        content = {key: value for key, value in data.items() if key != "_id"}
+    canonical_json = json.dumps(content, sort_keys=True, separators=(",", ":"), default=default_json_encoding)
+    return get_object_id_class()(hashlib.sha256(canonical_json.encode("utf-8")).digest()[:12])
+
+
+def check_id(data, use_content_id: bool = False, id_fields: list = None):
     if "_id" in data:
         if isinstance(data["_id"], str):
-            data["_id"] = ObjectId(data["_id"])
+            data["_id"] = get_object_id_class()(data["_id"])
+    elif use_content_id or id_fields:
+        data["_id"] = create_content_id(data, id_fields)
     else:
-        data["_id"] = ObjectId()
+        data["_id"] = get_object_id_class()()
     return data
 
 
@@ -20,15 +78,75 @@ def check_schema_version(data):
     return data
 
 
-def create_connection_to_mongodb(connection_string: str) -> MongoClient:
-    return MongoClient(connection_string)
+def create_pool_options(max_pool_size: int = None, min_pool_size: int = None, max_idle_time_ms: int = None) -> dict:
+    pool_options = {"maxPoolSize": max_pool_size, "minPoolSize": min_pool_size, "maxIdleTimeMS": max_idle_time_ms}
+    return {key: value for key, value in pool_options.items() if value is not None}
+
+
+def get_shared_client(connection_string: str, **pool_options):
+    from pymongo import MongoClient
+    from pylibcklb.mongo.monitoring import PoolStatisticsListener
+
+    # the pool options of the first request are used for the lifetime of the shared client
+    with _shared_clients_lock:
+        entry = _shared_clients.get(connection_string)
+        if entry is None:
+            listener = PoolStatisticsListener()
+            client = MongoClient(connection_string, event_listeners=[listener], **pool_options)
+            entry = {"client": client, "listener": listener, "requests": 0}
+            _shared_clients[connection_string] = entry
+        entry["requests"] += 1
+        return entry["client"]
+
+
+def is_shared_client(client) -> bool:
+    with _shared_clients_lock:
+        return any(entry["client"] is client for entry in _shared_clients.values())
+
+
+def close_shared_clients():
+    with _shared_clients_lock:
+        entries = list(_shared_clients.values())
+        _shared_clients.clear()
+    for entry in entries:
+        entry["client"].close()
+
+
+atexit.register(close_shared_clients)
+
+
+def redact_connection_string(connection_string: str) -> str:
+    return re.sub(r"//[^/@]*@", "//***@", connection_string)
+
+
+def get_pool_statistics() -> dict:
+    with _shared_clients_lock:
+        entries = dict(_shared_clients)
+    pool_statistics = {}
+    for connection_string, entry in entries.items():
+        statistics = entry["listener"].get_statistics()
+        statistics["client_requests"] = entry["requests"]
+        statistics["client_reuses"] = entry["requests"] - 1
+        pool_statistics[redact_connection_string(connection_string)] = statistics
+    return pool_statistics
+
+
+def create_connection_to_mongodb(connection_string: str, shared: bool = False, **pool_options):
+    from pymongo import MongoClient
+
+    with span("connect"):
+        if shared:
+            return get_shared_client(connection_string, **pool_options)
+        return MongoClient(connection_string, **pool_options)
 
 
-def close_connection_to_mongodb(client: MongoClient):
-    client.close()
+def close_connection_to_mongodb(client):
+    # shared clients keep their pool open for the next caller and are closed with close_shared_clients
+    if not is_shared_client(client):
+        client.close()
 
 
-def select_database(client: MongoClient, database_name: str):
+def select_database(client, database_name: str):
     return client[database_name]
 
 
@@ -37,11 +155,158 @@ def select_collection(database, collection_name: str):
 
 
 def run_operation_on_collection(collection, is_replacement, data):
-    if is_replacement:
-        document_id = data.pop("_id")
-        collection.replace_one({"_id": document_id}, data)
-    else:
-        collection.insert_one(data)
+    with span("write_documents"):
+        if is_replacement:
+            document_id = data.pop("_id")
+            collection.replace_one({"_id": document_id}, data)
+        else:
+            collection.insert_one(data)
+    increment("documents_written")
+
+
+def create_batches(documents, batch_size: int):
+    # checked before the first batch is requested, a batch size below 1 would never fill a batch
+    if batch_size < 1:
+        raise ValueError(f"The batch size must be at least 1, not {batch_size}")
+    return iterate_batches(documents, batch_size)
+
+
+def iterate_batches(documents, batch_size: int):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_batch_result(documents: list) -> dict:
+    return {"documents": len(documents), "inserted": 0, "matched": 0, "modified": 0, "upserted": 0, "retries": 0,
+            "errors": [], "write_concern_errors": []}
+
+
+def get_retry_delay(attempt: int) -> float:
+    # exponential backoff, the first retry waits RETRY_BACKOFF_SEC
+    return min(RETRY_BACKOFF_SEC * 2 ** (attempt - 1), MAX_RETRY_BACKOFF_SEC)
+
+
+def write_with_retries(write, operations: list, batch_result: dict, retries: int, count_result):
+    """
+    Run the bulk write function on the operations and retry the transient failures with a backoff
+    A lost connection (AutoReconnect, NetworkTimeout) sends the whole batch again, a BulkWriteError only the
+    operations that failed with an error code not in PERMANENT_ERROR_CODES. The errors are reported with the index
+    of the operation in the original batch.
+    """
+    from pymongo.errors import AutoReconnect, BulkWriteError
+
+    # position of every pending operation in the original batch
+    positions = list(range(len(operations)))
+    permanent_errors = []
+    pending_errors = []
+    for attempt in range(retries + 1):
+        if attempt:
+            batch_result["retries"] += 1
+            time.sleep(get_retry_delay(attempt))
+        try:
+            count_result(write(operations), operations)
+            pending_errors = []
+            break
+        except BulkWriteError as error:
+            for key, detail in BULK_WRITE_COUNTS:
+                batch_result[key] += error.details.get(detail, 0)
+            # the operations are applied, but the write concern is not satisfied
+            batch_result["write_concern_errors"].extend(error.details.get("writeConcernErrors", []))
+            pending_errors = []
+            retry_indexes = []
+            for write_error in error.details.get("writeErrors", []):
+                reported_error = dict(write_error, index=positions[write_error["index"]])
+                if write_error.get("code") in PERMANENT_ERROR_CODES:
+                    permanent_errors.append(reported_error)
+                else:
+                    pending_errors.append(reported_error)
+                    retry_indexes.append(write_error["index"])
+            operations = [operations[index] for index in retry_indexes]
+            positions = [positions[index] for index in retry_indexes]
+            if not operations:
+                break
+        except AutoReconnect:
+            # the documents written before the connection was lost are replaced again or fail as duplicate keys
+            if attempt == retries:
+                raise
+    batch_result["errors"] = sorted(permanent_errors + pending_errors, key=lambda error: error["index"])
+    return batch_result
+
+
+def run_bulk_replacement_on_collection(collection, documents: list, upsert: bool = True, retries: int = 0) -> dict:
+    from bson.raw_bson import RawBSONDocument
+    from pymongo import ReplaceOne
+
+    batch_result = create_batch_result(documents)
+    requests = []
+    for data in documents:
+        if isinstance(data, RawBSONDocument):
+            # a raw document can not be changed, the server accepts the _id as long as it matches the filter
+            document_id = data["_id"]
+        else:
+            document_id = data.pop("_id")
+        requests.append(ReplaceOne({"_id": document_id}, data, upsert=upsert))
+
+    def count_result(result, operations):
+        batch_result["matched"] += result.matched_count
+        batch_result["modified"] += result.modified_count
+        batch_result["upserted"] += result.upserted_count
+
+    return write_with_retries(lambda operations: collection.bulk_write(operations, ordered=False), requests,
+                              batch_result, retries, count_result)
+
+
+def run_bulk_insert_on_collection(collection, documents: list, retries: int = 0) -> dict:
+    batch_result = create_batch_result(documents)
+
+    def count_result(result, operations):
+        # inserted_ids does not contain the ids of RawBSONDocuments
+        batch_result["inserted"] += len(operations)
+
+    # with ordered=False the server applies every operation it can and reports the rest
+    return write_with_retries(lambda operations: collection.insert_many(operations, ordered=False), documents,
+                              batch_result, retries, count_result)
+
+
+def run_bulk_operation_on_collection(collection, is_replacement, documents: list, upsert: bool = False,
+                                     retries: int = 0) -> dict:
+    with span("write_documents"):
+        if is_replacement:
+            batch_result = run_bulk_replacement_on_collection(collection, documents, upsert, retries)
+        else:
+            batch_result = run_bulk_insert_on_collection(collection, documents, retries)
+    increment("batches")
+    increment("documents_written", batch_result["inserted"] + batch_result["matched"] + batch_result["upserted"])
+    increment("retries", batch_result["retries"])
+    increment("write_errors", len(batch_result["errors"]))
+    increment("write_concern_errors", len(batch_result["write_concern_errors"]))
+    return batch_result
+
+
+def get_failed_ids(batch_result: dict) -> list:
+    """
+    The _id of every failed operation of a batch, duplicate key errors do not count as failed
+    The document is already stored in the mongodb.
+    """
+    failed_ids = []
+    for error in batch_result["errors"]:
+        if error.get("code") == DUPLICATE_KEY_ERROR:
+            continue
+        operation = error.get("op") or {}
+        # the insert reports the document, the replacement the filter and the replacement document
+        failed_ids.append(operation["_id"] if "_id" in operation else (operation.get("q") or {}).get("_id"))
+    return failed_ids
+
+
+def has_transient_errors(batch_result: dict) -> bool:
+    # errors that were still failing when the retries ran out, sending the operations later can succeed
+    return any(error.get("code") not in PERMANENT_ERROR_CODES for error in batch_result["errors"])
 
 
 def create_connection_string(mongo_credentials) -> str:
@@ -0,0 +1,94 @@
+import os
+import re
+import sqlite3
+import threading
+
+import bson
+
+# sqlite allows up to 999 variables per statement in older versions, one of them is the target
+QUERY_CHUNK_SIZE = 500
+# the scheme and the credentials in front of the hosts of a connection string
+CONNECTION_STRING_PREFIX = re.compile(r"^[a-z+]+://([^@/]*@)?")
+
+
+def encode_id(document_id) -> bytes:
+    # works for every bson type of an _id, an ObjectId is stored with its 12 bytes
+    if isinstance(document_id, bson.ObjectId):
+        return document_id.binary
+    return bson.encode({"_id": document_id})
+
+
+def create_target(connection_string: str, database_name: str, collection_name: str) -> str:
+    # the hosts without credentials and options, e.g. localhost:27017/test.build_env_info
+    hosts = CONNECTION_STRING_PREFIX.sub("", connection_string or "").split("/", 1)[0].split("?", 1)[0]
+    return f"{hosts}/{database_name}.{collection_name}"
+
+
+class SeenIdIndex:
+    """
+    Local sqlite index of the _id values that were already written to a collection of a mongodb
+    Together with content ids (check_id with use_content_id) documents that were sent before are skipped before
+    they reach the network. Only the ids of acknowledged writes are added, a failed write is sent again next time.
+    Every target (create_target) has its own ids, clear forgets the ids of a dropped or cleaned collection.
+    """
+
+    def __init__(self, filename: str, target: str = ""):
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        # the asyncio pipeline of the bulk mode reads the documents on an executor thread
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.lock = threading.Lock()
+        # the index is only a cache of the server state, a lost transaction only causes a write the server dedupes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.target = target
+        self.connection.execute("CREATE TABLE IF NOT EXISTS target_seen_ids (target TEXT NOT NULL, id BLOB NOT NULL, "
+                                "PRIMARY KEY (target, id)) WITHOUT ROWID")
+        self.connection.commit()
+
+    def get_seen_ids(self, encoded_ids: list) -> set:
+        seen_ids = set()
+        with self.lock:
+            for start in range(0, len(encoded_ids), QUERY_CHUNK_SIZE):
+                chunk = encoded_ids[start:start + QUERY_CHUNK_SIZE]
+                query = f"SELECT id FROM target_seen_ids WHERE target = ? AND id IN ({','.join('?' * len(chunk))})"
+                seen_ids.update(row[0] for row in self.connection.execute(query, [self.target] + chunk))
+        return seen_ids
+
+    def __contains__(self, document_id) -> bool:
+        return bool(self.get_seen_ids([encode_id(document_id)]))
+
+    def filter_unseen(self, documents: list) -> list:
+        # one query per chunk of documents, duplicates inside of the documents are also removed
+        encoded_ids = [encode_id(document["_id"]) for document in documents]
+        seen_ids = self.get_seen_ids(encoded_ids)
+        unseen_documents = []
+        for encoded_id, document in zip(encoded_ids, documents):
+            if encoded_id not in seen_ids:
+                seen_ids.add(encoded_id)
+                unseen_documents.append(document)
+        return unseen_documents
+
+    def add(self, document_ids):
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO target_seen_ids (target, id) VALUES (?, ?)",
+                                        ((self.target, encode_id(document_id)) for document_id in document_ids))
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM target_seen_ids WHERE target = ?", (self.target,))
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM target_seen_ids WHERE target = ?",
+                                           (self.target,)).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> "SeenIdIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
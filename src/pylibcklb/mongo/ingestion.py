@@ -0,0 +1,66 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from pylibcklb.mongo.common import run_bulk_operation_on_collection
+
+
+def take_batch(iterator, batch_size: int) -> list:
+    return list(itertools.islice(iterator, batch_size))
+
+
+async def ingest_documents_async(collection, documents, is_replacement: bool = False, batch_size: int = 1000,
+                                 max_concurrent_batches: int = 4, upsert: bool = False, retries: int = 0) -> list:
+    """
+    Read, decode and write documents in an overlapping pipeline
+    One reader fills a bounded queue with batches while up to max_concurrent_batches bulk writes are in flight,
+    so at most 2 * max_concurrent_batches batches are held in memory at the same time.
+    """
+    # without a writer the reader would queue every document and nothing would be written
+    if max_concurrent_batches < 1:
+        raise ValueError(f"max_concurrent_batches must be at least 1, not {max_concurrent_batches}")
+    if batch_size < 1:
+        raise ValueError(f"The batch size must be at least 1, not {batch_size}")
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_concurrent_batches)
+    iterator = iter(documents)
+    batch_results = {}
+
+    # pymongo is blocking, reading the documents and every bulk write therefore gets its own thread
+    with ThreadPoolExecutor(max_workers=max_concurrent_batches + 1) as executor:
+
+        async def read_batches():
+            for batch_number in itertools.count():
+                batch = await loop.run_in_executor(executor, take_batch, iterator, batch_size)
+                if not batch:
+                    break
+                # blocks while all writers are busy and the queue is full
+                await queue.put((batch_number, batch))
+            for _ in range(max_concurrent_batches):
+                await queue.put(None)
+
+        async def write_batches():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                batch_number, batch = item
+                batch_results[batch_number] = await loop.run_in_executor(
+                    executor, run_bulk_operation_on_collection, collection, is_replacement, batch, upsert, retries)
+
+        tasks = [asyncio.ensure_future(read_batches())]
+        tasks.extend(asyncio.ensure_future(write_batches()) for _ in range(max_concurrent_batches))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    return [batch_results[batch_number] for batch_number in sorted(batch_results)]
+
+
+def ingest_documents(collection, documents, is_replacement: bool = False, batch_size: int = 1000,
+                     max_concurrent_batches: int = 4, upsert: bool = False, retries: int = 0) -> list:
+    return asyncio.run(ingest_documents_async(collection, documents, is_replacement, batch_size,
+                                              max_concurrent_batches, upsert, retries))
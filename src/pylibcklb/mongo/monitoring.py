@@ -0,0 +1,56 @@
+import threading
+
+from pymongo.monitoring import ConnectionPoolListener
+
+
+class PoolStatisticsListener(ConnectionPoolListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statistics = {"connections_created": 0, "connections_closed": 0, "connections_checked_out": 0,
+                           "connections_checked_in": 0, "connection_check_out_failures": 0, "pools_cleared": 0}
+
+    def _increment(self, key: str):
+        with self._lock:
+            self.statistics[key] += 1
+
+    def get_statistics(self) -> dict:
+        with self._lock:
+            statistics = dict(self.statistics)
+        statistics["connections_open"] = statistics["connections_created"] - statistics["connections_closed"]
+        statistics["connections_in_use"] = \
+            statistics["connections_checked_out"] - statistics["connections_checked_in"]
+        return statistics
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("connection_check_out_failures")
+
+    def connection_checked_out(self, event):
+        self._increment("connections_checked_out")
+
+    def connection_checked_in(self, event):
+        self._increment("connections_checked_in")
@@ -0,0 +1,101 @@
+import mmap
+import os
+import struct
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidBSON
+from bson.raw_bson import RawBSONDocument
+
+from pylibcklb.mongo.common import check_id, check_schema_version
+
+BSON_FILE_EXTENSIONS = (".bson",)
+INT32 = struct.Struct("<i")
+# size of the element values with a fixed length, see https://bsonspec.org/spec.html
+FIXED_VALUE_SIZES = {0x01: 8, 0x06: 0, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16,
+                     0x7F: 0, 0xFF: 0}
+STRING_TYPES = (0x02, 0x0D, 0x0E)
+DOCUMENT_TYPES = (0x03, 0x04, 0x0F)
+BSON_STRING = 0x02
+
+
+def is_bson_file(filename: str) -> bool:
+    return filename.lower().endswith(BSON_FILE_EXTENSIONS)
+
+
+def iterate_bson_documents(working_directory: str, bson_filename: str):
+    """
+    Yield the documents of a .bson file or a mongodump-style stream of concatenated documents as RawBSONDocument
+    The file is memory-mapped and every document is only sliced out of it, nothing is decoded.
+    """
+    with open(os.path.join(working_directory, bson_filename), 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            offset = 0
+            file_size = len(mapped_file)
+            while offset < file_size:
+                if file_size - offset < 5:
+                    raise InvalidBSON(f"Truncated document at offset {offset} of {bson_filename}")
+                document_size = INT32.unpack_from(mapped_file, offset)[0]
+                end = offset + document_size
+                if document_size < 5 or end > file_size or mapped_file[end - 1] != 0:
+                    raise InvalidBSON(f"Invalid document size {document_size} at offset {offset} of {bson_filename}")
+                yield RawBSONDocument(mapped_file[offset:end])
+                offset = end
+
+
+def get_top_level_element_types(raw: bytes) -> dict:
+    # walks the elements of the document without decoding their values
+    element_types = {}
+    position = 4
+    end = len(raw) - 1
+    while position < end:
+        element_type = raw[position]
+        name_end = raw.index(b"\x00", position + 1)
+        element_types[raw[position + 1:name_end].decode()] = element_type
+        position = name_end + 1
+        if element_type in FIXED_VALUE_SIZES:
+            position += FIXED_VALUE_SIZES[element_type]
+        elif element_type in STRING_TYPES:
+            position += 4 + INT32.unpack_from(raw, position)[0]
+        elif element_type in DOCUMENT_TYPES:
+            position += INT32.unpack_from(raw, position)[0]
+        elif element_type == 0x05:
+            position += 5 + INT32.unpack_from(raw, position)[0]
+        elif element_type == 0x0B:
+            position = raw.index(b"\x00", raw.index(b"\x00", position) + 1) + 1
+        elif element_type == 0x0C:
+            position += 4 + INT32.unpack_from(raw, position)[0] + 12
+        else:
+            raise InvalidBSON(f"Unknown element type {element_type:#04x}")
+    return element_types
+
+
+def apply_raw_adaptations(raw_document: RawBSONDocument, use_content_id: bool = False,
+                          id_fields: list = None) -> RawBSONDocument:
+    """
+    Apply check_id and check_schema_version to a RawBSONDocument
+    A missing _id or schema_version is spliced into the raw bytes, only string values that need a conversion
+    or a content id cause a decode and encode of the document.
+    """
+    raw = raw_document.raw
+    element_types = get_top_level_element_types(raw)
+    needs_content_id = (use_content_id or bool(id_fields)) and "_id" not in element_types
+    if element_types.get("_id") == BSON_STRING or element_types.get("schema_version") == BSON_STRING or \
+            needs_content_id:
+        data = bson.decode(raw)
+        data = check_id(data, use_content_id, id_fields)
+        data = check_schema_version(data)
+        return RawBSONDocument(bson.encode(data))
+    if "_id" in element_types and "schema_version" in element_types:
+        return raw_document
+    prefix = b""
+    suffix = b""
+    if "_id" not in element_types:
+        # the server would also move the _id to the front
+        prefix = b"\x07_id\x00" + ObjectId().binary
+    if "schema_version" not in element_types:
+        suffix = b"\x10schema_version\x00" + INT32.pack(1)
+    body = raw[4:-1]
+    return RawBSONDocument(INT32.pack(4 + len(prefix) + len(body) + len(suffix) + 1) + prefix + body + suffix + b"\x00")
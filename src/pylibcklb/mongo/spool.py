@@ -0,0 +1,243 @@
+import contextlib
+import os
+import threading
+import time
+import uuid
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+from pylibcklb.metrics.common import span, increment
+from pylibcklb.mongo.common import create_batches, run_bulk_operation_on_collection, get_failed_ids, \
+    has_transient_errors
+from pylibcklb.mongo.rawbson import INT32, iterate_bson_documents
+
+SEGMENT_EXTENSION = ".bson"
+# a segment that is still written, the drain only reads sealed segments
+ACTIVE_EXTENSION = ".open"
+# a sealed segment a drain claimed by renaming it, so concurrent drains do not replay the same segment
+CLAIMED_EXTENSION = ".draining"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+# an active segment that was not written for this long belongs to a crashed writer and is sealed by the drain, a
+# claimed segment that was not released for this long belongs to a crashed drain and is released again
+STALE_SEGMENT_SEC = 3600
+REJECTED_DIRECTORY = "rejected"
+
+
+def create_segment_name() -> str:
+    # sorts by creation time, the pid and the random part keep concurrent writers apart
+    return f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def get_complete_size(path: str) -> int:
+    # size of the complete documents at the start of the segment, a crash may leave a partial document at its end
+    complete_size = 0
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        while file_size - complete_size >= 4:
+            f.seek(complete_size)
+            document_size = INT32.unpack(f.read(4))[0]
+            if document_size < 5 or complete_size + document_size > file_size:
+                break
+            complete_size += document_size
+    return complete_size
+
+
+def seal_segment(path: str) -> str:
+    complete_size = get_complete_size(path)
+    if complete_size != os.path.getsize(path):
+        os.truncate(path, complete_size)
+    sealed_path = path[:-len(ACTIVE_EXTENSION)] + SEGMENT_EXTENSION
+    os.replace(path, sealed_path)
+    return sealed_path
+
+
+class Spool:
+    """
+    Durable local write-ahead spool of documents for the mongodb
+    The documents are appended as bson to an active segment file and fsynced before append returns. A segment is
+    sealed when it reaches the maximum size, on rotate and on close, and drain_spool replays the sealed segments.
+    The documents need their _id before they are spooled, so a segment that is replayed twice creates no duplicates.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.file = None
+        self.active_path = None
+        self.size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, documents: list):
+        data = b"".join(document.raw if isinstance(document, RawBSONDocument) else bson.encode(document)
+                        for document in documents)
+        if not data:
+            return
+        with span("spool_documents"):
+            if self.file is None:
+                self.active_path = os.path.join(self.directory, create_segment_name() + ACTIVE_EXTENSION)
+                self.file = open(self.active_path, 'ab')
+                self.size = 0
+            # one write call per append, a crash can only cut the last document
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.size += len(data)
+        increment("documents_spooled", len(documents))
+        if self.size >= self.segment_max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.replace(self.active_path, self.active_path[:-len(ACTIVE_EXTENSION)] + SEGMENT_EXTENSION)
+
+    def close(self):
+        self.rotate()
+
+    def __enter__(self) -> "Spool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def list_segments(directory: str, stale_after_sec: float = STALE_SEGMENT_SEC) -> list:
+    if not os.path.isdir(directory):
+        return []
+    names = []
+    now = time.time()
+    for name in os.listdir(directory):
+        if name.endswith(ACTIVE_EXTENSION) or name.endswith(CLAIMED_EXTENSION):
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) <= stale_after_sec:
+                    continue
+                if name.endswith(ACTIVE_EXTENSION):
+                    names.append(os.path.basename(seal_segment(path)))
+                else:
+                    names.append(release_segment(directory, name))
+            except FileNotFoundError:
+                # sealed, released or drained by another process in the meantime
+                continue
+        elif name.endswith(SEGMENT_EXTENSION):
+            names.append(name)
+    return sorted(names)
+
+
+def claim_segment(directory: str, name: str) -> str:
+    """
+    Rename a sealed segment to claim it for one drain, None when another drain claimed or deleted it first
+    The claim time is the modification time, list_segments releases the claims of a crashed drain when they are stale.
+    """
+    path = os.path.join(directory, name)
+    claimed_path = path[:-len(SEGMENT_EXTENSION)] + CLAIMED_EXTENSION
+    try:
+        os.rename(path, claimed_path)
+    except FileNotFoundError:
+        return None
+    os.utime(claimed_path)
+    return os.path.basename(claimed_path)
+
+
+def release_segment(directory: str, claimed_name: str) -> str:
+    # the segment is replayed again by the next drain
+    name = claimed_name[:-len(CLAIMED_EXTENSION)] + SEGMENT_EXTENSION
+    os.replace(os.path.join(directory, claimed_name), os.path.join(directory, name))
+    return name
+
+
+def drain_spool(directory: str, collection, batch_size: int = 1000, is_replacement: bool = False,
+                upsert: bool = False, retries: int = 0, stale_after_sec: float = STALE_SEGMENT_SEC,
+                acknowledge=None) -> dict:
+    """
+    Replay the sealed segments of a spool in bulk batches and delete every segment the mongodb acknowledged
+    Duplicate key errors count as acknowledged, they come from a replay of a partly drained segment. Documents the
+    mongodb rejects with a permanent error are moved to the rejected sub directory instead of blocking the spool.
+    When the connection fails, a batch reports write concern errors or transient errors remain after the retries,
+    the drain stops and keeps the remaining segments for the next drain. Every segment is claimed before it is
+    replayed, so concurrent drains (e.g. --drain and the drain thread of the daemon mode) skip it.
+    acknowledge is called with the _id values of every segment before it is deleted, without the rejected ones.
+    """
+    from pymongo.errors import ConnectionFailure
+
+    summary = {"segments": 0, "documents": 0, "rejected": 0, "is_complete": True}
+    for name in list_segments(directory, stale_after_sec):
+        claimed_name = claim_segment(directory, name)
+        if claimed_name is None:
+            continue
+        rejected_documents = []
+        acknowledged_ids = []
+        documents = 0
+        is_acknowledged = True
+        try:
+            with span("drain_segment"):
+                for batch in create_batches(iterate_bson_documents(directory, claimed_name), batch_size):
+                    batch_result = run_bulk_operation_on_collection(collection, is_replacement, batch, upsert,
+                                                                    retries)
+                    if batch_result["write_concern_errors"] or has_transient_errors(batch_result):
+                        # the documents are written but not durable yet or the mongodb is not able to take them
+                        # now, the replay reports the written ones as duplicates
+                        is_acknowledged = False
+                        break
+                    failed_ids = get_failed_ids(batch_result)
+                    for document in batch:
+                        if document["_id"] in failed_ids:
+                            rejected_documents.append(document)
+                        else:
+                            acknowledged_ids.append(document["_id"])
+                    documents += len(batch)
+        except ConnectionFailure:
+            is_acknowledged = False
+        except BaseException:
+            release_segment(directory, claimed_name)
+            raise
+        if not is_acknowledged:
+            release_segment(directory, claimed_name)
+            summary["is_complete"] = False
+            break
+        if rejected_documents:
+            with Spool(os.path.join(directory, REJECTED_DIRECTORY)) as rejected_spool:
+                rejected_spool.append(rejected_documents)
+        if acknowledge is not None:
+            acknowledge(acknowledged_ids)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(directory, claimed_name))
+        summary["segments"] += 1
+        summary["documents"] += documents
+        summary["rejected"] += len(rejected_documents)
+    increment("documents_drained", summary["documents"])
+    return summary
+
+
+class DrainThread(threading.Thread):
+    """
+    Drain the spool in the background every interval until stop is called
+    """
+
+    def __init__(self, directory: str, collection, interval_sec: float, logger, **drain_options):
+        super().__init__(name="spool-drain", daemon=True)
+        self.directory = directory
+        self.collection = collection
+        self.interval_sec = interval_sec
+        self.logger = logger
+        self.drain_options = drain_options
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_sec):
+            try:
+                summary = drain_spool(self.directory, self.collection, **self.drain_options)
+            except Exception:
+                # e.g. an OperationFailure of the authentication or a full disk, the next interval tries again
+                self.logger.exception("Could not drain the spool %s", self.directory)
+                continue
+            self.logger.info("Drained %s documents of %s segments from the spool %s", summary["documents"],
+                             summary["segments"], self.directory)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
@@ -0,0 +1,5 @@
+SCRIPT_MODULES = ["pylibcklb.scripts.sendJson2Mongo", "pylibcklb.scripts.extractBuildEnvInfo",
+                  "pylibcklb.scripts.migrateBuildEnvInfo"]
+# modules the scripts only need after the argument parsing, they are imported where they are used
+HEAVY_MODULES = ["pymongo", "bson", "psutil", "cpuinfo", "git", "asyncio", "sqlite3", "orjson", "zstandard",
+                 "multiprocessing"]
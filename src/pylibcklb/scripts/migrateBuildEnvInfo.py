@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import logging
+import os
+import sys
+
+from pylibcklb.buildenv.common import SCHEMA_VERSION, migrate_document
+from pylibcklb.json.common import iterate_data, encode_json, compress_data, check_compression, open_atomically, \
+    COMPRESSION_EXTENSIONS
+from pylibcklb.logging.common import LOG_FORMATS, create_logger
+from pylibcklb.mongo.common import create_connection_to_mongodb, close_connection_to_mongodb, select_database, \
+    select_collection, create_batches, run_bulk_replacement_on_collection
+
+# documents without schema_version and with the string "1" are of schema_version 1 too, see check_schema_version
+SCHEMA_VERSION_1_FILTER = {"$or": [{"schema_version": {"$in": [1, "1"]}}, {"schema_version": {"$exists": False}}]}
+
+
+def parse_positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
+
+
+def create_argumentparser(program_name: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=program_name,
+        description=f"The help of {program_name}",
+        epilog="")
+    parser.add_argument(
+        '-d', '--debug',
+        help="Print lots of debugging statements",
+        action="store_const", dest="loglevel", const=logging.DEBUG,
+        default=logging.WARNING,
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        help="Be verbose",
+        action="store_const", dest="loglevel", const=logging.INFO,
+    )
+    parser.add_argument(
+        '--log-queue',
+        help="Write the log records from a background thread instead of blocking the caller",
+        action="store_const", dest="use_log_queue", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--log-format',
+        help="Format of the log records",
+        action="store", dest="log_format", choices=LOG_FORMATS,
+        default="text",
+    )
+    parser.add_argument(
+        '-conn', '--connection-string',
+        help="Connection string to create a connection to the mongodb",
+        action="store", dest="connection_string",
+        default=os.getenv("MONGODB_CONNECTION_STRING", None)
+    )
+    parser.add_argument(
+        '-db', '--database',
+        help="Database name which to use",
+        action="store", dest="database_name",
+        default="test"
+    )
+    parser.add_argument(
+        '-cn', '--collection-name',
+        help="Collection name in the mongodb with the documents to migrate",
+        action="store", dest="collection_name",
+        default="build_env_info"
+    )
+    parser.add_argument(
+        '-b', '--batch-size',
+        help="Number of documents that are replaced with one bulk operation",
+        action="store", dest="batch_size", type=parse_positive_int,
+        default=1000,
+    )
+    parser.add_argument(
+        '--retries',
+        help="How often the failed replacements of a batch are sent again",
+        action="store", dest="retries", type=int,
+        default=2,
+    )
+    parser.add_argument(
+        '--dry-run',
+        help="Only count the documents that would be migrated",
+        action="store_const", dest="is_dry_run", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '-json-filename',
+        help="Migrate the documents of a json file instead of the mongodb",
+        action="store", dest="json_filename",
+    )
+    parser.add_argument(
+        '-json-output-filename',
+        help="Newline delimited json file for the migrated documents of the json file",
+        action="store", dest="json_output_filename",
+    )
+    parser.add_argument(
+        '-w', '--working-dir',
+        help="Define the working directory",
+        action="store", dest="working_directory",
+        default=os.getcwd(),
+    )
+    return parser
+
+
+def migrate_collection(args, logger) -> dict:
+    client = create_connection_to_mongodb(args.connection_string, shared=True)
+    db = select_database(client, args.database_name)
+    collection = select_collection(db, args.collection_name)
+    migration_result = {"documents": 0, "modified": 0, "errors": 0}
+    # a document the cursor returns again after its replacement is already migrated and stays unchanged
+    cursor = collection.find(SCHEMA_VERSION_1_FILTER, batch_size=args.batch_size)
+    for batch_number, batch in enumerate(create_batches(cursor, args.batch_size)):
+        migration_result["documents"] += len(batch)
+        if args.is_dry_run:
+            continue
+        batch_result = run_bulk_replacement_on_collection(collection, [migrate_document(document)
+                                                                       for document in batch],
+                                                          upsert=False, retries=args.retries)
+        migration_result["modified"] += batch_result["modified"]
+        migration_result["errors"] += len(batch_result["errors"])
+        logger.info(f"Batch {batch_number}: {batch_result['documents']} documents, "
+                    f"{batch_result['modified']} modified, {len(batch_result['errors'])} errors")
+        for error in batch_result["errors"]:
+            logger.error(f"Batch {batch_number}: {error.get('errmsg')}")
+    close_connection_to_mongodb(client)
+    return migration_result
+
+
+def migrate_file(args, logger) -> dict:
+    output_filename = args.json_output_filename or f"{args.json_filename}.v{SCHEMA_VERSION}.json"
+    compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(output_filename)[1].lower())
+    check_compression(compression)
+    migration_result = {"documents": 0, "modified": 0, "errors": 0}
+    # the output replaces an existing file only when the migration is complete, a dry run leaves it in place
+    output = contextlib.nullcontext() if args.is_dry_run else \
+        open_atomically(os.path.join(args.working_directory, output_filename))
+    with output as file:
+        documents = iterate_data(args.working_directory, args.json_filename)
+        for batch in create_batches(documents, args.batch_size):
+            migration_result["documents"] += len(batch)
+            migration_result["modified"] += sum(int(document.get("schema_version", 1)) == 1 for document in batch)
+            if file is not None:
+                file.write(compress_data("".join(encode_json(migrate_document(document)) + "\n"
+                                                 for document in batch).encode("utf-8"), compression))
+    if args.is_dry_run:
+        logger.info(f"Counted the documents of {args.json_filename} without writing {output_filename}")
+    else:
+        logger.info(f"Migrated {args.json_filename} to {output_filename}")
+    return migration_result
+
+
+def get_arguments():
+    argument_parser = create_argumentparser(os.path.basename(__file__))
+    if len(sys.argv) == 1:
+        argument_parser.print_help()
+        raise SystemExit(1)
+    return argument_parser.parse_args()
+
+
+def main():
+    arguments = get_arguments()
+    program_logger = create_logger(os.path.basename(__file__), arguments.loglevel, arguments.use_log_queue,
+                                   arguments.log_format)
+
+    if arguments.json_filename:
+        migration_result = migrate_file(arguments, program_logger)
+    elif arguments.connection_string:
+        program_logger.info(f"Migrate the documents of the {arguments.database_name} database "
+                            f"and {arguments.collection_name} collection to schema_version {SCHEMA_VERSION}.")
+        migration_result = migrate_collection(arguments, program_logger)
+    else:
+        program_logger.info(f"No connection string is given")
+        return
+    program_logger.info(f"Migration result: {migration_result}")
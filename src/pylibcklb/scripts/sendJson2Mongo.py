@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
+import glob
+import itertools
 import logging
 import os
 import sys
 
-from pylibcklb.json.common import load_data
-from pylibcklb.logging.common import create_logger
+from pylibcklb.json.common import load_data, iterate_data, iterate_data_parallel
+from pylibcklb.logging.common import LOG_FORMATS, create_logger
+from pylibcklb.metrics.common import span, increment, enable_metrics, export_metrics
 from pylibcklb.mongo.common import check_id, check_schema_version, create_connection_to_mongodb, \
     close_connection_to_mongodb, select_database, select_collection, \
-    run_operation_on_collection
+    run_operation_on_collection, create_batches, run_bulk_operation_on_collection, create_pool_options, \
+    get_pool_statistics, get_failed_ids
+
+
+def parse_positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
 
 
 def create_argumentparser(program_name: str) -> argparse.ArgumentParser:
@@ -28,12 +40,39 @@ def create_argumentparser(program_name: str) -> argparse.ArgumentParser:
         help="Be verbose",
         action="store_const", dest="loglevel", const=logging.INFO,
     )
+    parser.add_argument(
+        '--log-queue',
+        help="Write the log records from a background thread instead of blocking the caller",
+        action="store_const", dest="use_log_queue", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--log-format',
+        help="Format of the log records",
+        action="store", dest="log_format", choices=LOG_FORMATS,
+        default="text",
+    )
     parser.add_argument(
         '-conn', '--connection-string',
         help="Connection string to create a connection to the mongodb",
         action="store", dest="connection_string",
         default=os.getenv("MONGODB_CONNECTION_STRING", None)
     )
+    parser.add_argument(
+        '--max-pool-size',
+        help="Maximum number of connections in the connection pool of the shared client",
+        action="store", dest="max_pool_size", type=int,
+    )
+    parser.add_argument(
+        '--min-pool-size',
+        help="Minimum number of connections in the connection pool of the shared client",
+        action="store", dest="min_pool_size", type=int,
+    )
+    parser.add_argument(
+        '--max-idle-time-ms',
+        help="Milliseconds a pooled connection may stay idle before it is closed",
+        action="store", dest="max_idle_time_ms", type=int,
+    )
     parser.add_argument(
         '-db', '--database',
         help="Database name which to use",
@@ -50,11 +89,114 @@ def create_argumentparser(program_name: str) -> argparse.ArgumentParser:
         action="store_const", dest="is_replacement", const=True,
         default=False,
     )
+    parser.add_argument(
+        '-u', '--upsert',
+        help="Insert the document if the bulk mode replacement does not find it",
+        action="store_const", dest="is_upsert", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--retries',
+        help="How often the failed operations of a bulk mode batch (inserts and replacements) are sent again",
+        action="store", dest="retries", type=int,
+        default=2,
+    )
     parser.add_argument(
         '-json-filename',
         help="Define a specific name for the json output file",
         action="store", dest="json_filename",
     )
+    parser.add_argument(
+        '-json-filenames',
+        help="Send several json files in bulk mode",
+        action="store", dest="json_filenames", nargs="+",
+        default=[],
+    )
+    parser.add_argument(
+        '-json-directory',
+        help="Send all json and bson files of a directory in bulk mode",
+        action="store", dest="json_directory",
+    )
+    parser.add_argument(
+        '-json-glob',
+        help="Send all json and bson files matching the glob pattern in bulk mode",
+        action="store", dest="json_glob",
+    )
+    parser.add_argument(
+        '--content-id',
+        help="Derive a missing _id from a hash of the document content, so a file sent again creates no duplicates",
+        action="store_const", dest="use_content_id", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--id-fields',
+        help="Derive a missing _id from a hash of these fields (dotted paths) instead of the whole content",
+        action="store", dest="id_fields", nargs="+",
+        default=[],
+    )
+    parser.add_argument(
+        '--seen-index',
+        help="Sqlite file of the _id values already sent, documents with a known _id are skipped",
+        action="store", dest="seen_index_file",
+    )
+    parser.add_argument(
+        '--reset-seen-index',
+        help="Forget the _id values the seen index holds for the target, e.g. after the collection was dropped",
+        action="store_const", dest="is_seen_index_reset", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--spool',
+        help="Append the documents to the segment files of this local spool directory instead of the mongodb",
+        action="store", dest="spool_directory",
+    )
+    parser.add_argument(
+        '--drain',
+        help="Replay the segments of the spool directory to the mongodb and delete the acknowledged segments",
+        action="store_const", dest="is_drain", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '-b', '--batch-size',
+        help="Number of documents that are written with one bulk operation",
+        action="store", dest="batch_size", type=parse_positive_int,
+        default=1000,
+    )
+    parser.add_argument(
+        '--async',
+        help="Overlap reading, decoding and writing of the bulk mode with an asyncio pipeline",
+        action="store_const", dest="use_async", const=True,
+        default=False,
+    )
+    parser.add_argument(
+        '--max-concurrent-batches',
+        help="Maximum number of batches written at the same time by the asyncio pipeline",
+        action="store", dest="max_concurrent_batches", type=parse_positive_int,
+        default=4,
+    )
+    parser.add_argument(
+        '--decode-processes',
+        help="Decode the json files of the bulk mode on a pool with this number of processes",
+        action="store", dest="decode_processes", type=int,
+        default=0,
+    )
+    parser.add_argument(
+        '--unordered',
+        help="Allow the decode processes to deliver the files and the parts of large newline delimited files in "
+             "the order they are finished",
+        action="store_const", dest="is_ordered", const=False,
+        default=True,
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help="Write the timings of the stages and the counters as json summary to this file",
+        action="store", dest="metrics_filename",
+    )
+    parser.add_argument(
+        '--metrics-textfile',
+        help="Write the timings of the stages and the counters to this file of the Prometheus textfile collector",
+        action="store", dest="metrics_textfile",
+    )
     parser.add_argument(
         '-w', '--working-dir',
         help="Define a specific name for the json output file",
@@ -64,20 +206,228 @@ def create_argumentparser(program_name: str) -> argparse.ArgumentParser:
     return parser
 
 
-def apply_need_adaptations(data):
-    data = check_id(data)
-    data = check_schema_version(data)
+def apply_need_adaptations(data, use_content_id: bool = False, id_fields: list = None):
+    with span("apply_need_adaptations"):
+        data = check_id(data, use_content_id, id_fields)
+        data = check_schema_version(data)
     return data
 
 
-def send_file(args):
-    client = create_connection_to_mongodb(args.connection_string)
+def open_seen_index(args):
+    if not args.seen_index_file:
+        return None
+    from pylibcklb.mongo.deduplication import SeenIdIndex, create_target
+
+    # the ids are kept per host, database and collection, the same files can be sent to another target
+    seen_index = SeenIdIndex(os.path.join(args.working_directory, args.seen_index_file),
+                             create_target(args.connection_string, args.database_name, args.collection_name))
+    if args.is_seen_index_reset:
+        seen_index.clear()
+    return seen_index
+
+
+def open_spool(args):
+    from pylibcklb.mongo.spool import Spool
+
+    return Spool(os.path.join(args.working_directory, args.spool_directory))
+
+
+def send_file(args) -> bool:
+    data = load_data(args.working_directory, args.json_filename)
+    data = apply_need_adaptations(data, args.use_content_id, args.id_fields)
+    seen_index = open_seen_index(args)
+    document_id = data["_id"]
+    if seen_index is not None and document_id in seen_index:
+        increment("documents_skipped")
+        seen_index.close()
+        return False
+    if args.spool_directory:
+        # the drain adds the id to the seen index once the mongodb acknowledged it
+        with open_spool(args) as spool:
+            spool.append([data])
+        if seen_index is not None:
+            seen_index.close()
+        return True
+    client = create_connection_to_mongodb(args.connection_string, shared=True,
+                                          **create_pool_options(args.max_pool_size, args.min_pool_size,
+                                                                args.max_idle_time_ms))
     db = select_database(client, args.database_name)
     collection = select_collection(db, args.collection_name)
-    data = load_data(args.working_directory, args.json_filename)
-    data = apply_need_adaptations(data)
     run_operation_on_collection(collection, args.is_replacement, data)
     close_connection_to_mongodb(client)
+    if seen_index is not None:
+        seen_index.add([document_id])
+        seen_index.close()
+    return True
+
+
+def is_bulk_mode(args) -> bool:
+    return bool(args.json_filenames or args.json_directory or args.json_glob)
+
+
+def collect_json_filenames(args) -> list:
+    filenames = [os.path.join(args.working_directory, filename) for filename in args.json_filenames]
+    if args.json_directory:
+        directory = os.path.join(args.working_directory, args.json_directory)
+        filenames.extend(sorted(glob.glob(os.path.join(glob.escape(directory), "*.json")) +
+                                glob.glob(os.path.join(glob.escape(directory), "*.bson"))))
+    if args.json_glob:
+        filenames.extend(sorted(glob.glob(os.path.join(args.working_directory, args.json_glob), recursive=True)))
+    # keep the given order but send every file only once
+    return list(dict.fromkeys(os.path.abspath(filename) for filename in filenames))
+
+
+def iterate_documents(filenames: list, use_content_id: bool = False, id_fields: list = None):
+    from pylibcklb.mongo.rawbson import is_bson_file, iterate_bson_documents, apply_raw_adaptations
+
+    # documents are streamed so only the current batch is held in memory
+    for filename in filenames:
+        increment("files")
+        working_directory, basename = os.path.split(filename)
+        if is_bson_file(filename):
+            # bson files are passed through as raw documents without decoding them
+            for raw_document in iterate_bson_documents(working_directory, basename):
+                increment("bytes_read", len(raw_document.raw))
+                with span("apply_need_adaptations"):
+                    raw_document = apply_raw_adaptations(raw_document, use_content_id, id_fields)
+                yield raw_document
+        else:
+            for data in iterate_data(working_directory, basename):
+                yield apply_need_adaptations(data, use_content_id, id_fields)
+
+
+def iterate_unseen_documents(documents, seen_index, batch_size: int, sent_ids: list, statistics: dict):
+    # the index is queried once per batch, the ids are taken before a replacement removes them from the documents
+    for batch in create_batches(documents, batch_size):
+        unseen_documents = seen_index.filter_unseen(batch)
+        statistics["skipped"] += len(batch) - len(unseen_documents)
+        increment("documents_skipped", len(batch) - len(unseen_documents))
+        for document in unseen_documents:
+            if sent_ids is not None:
+                sent_ids.append(document["_id"])
+            yield document
+
+
+def add_acknowledged_ids(seen_index, document_ids: list, batch_results: list):
+    if any(batch_result["write_concern_errors"] for batch_result in batch_results):
+        # the writes are not durable yet, the documents are sent again next time
+        return
+    failed_ids = set()
+    for batch_result in batch_results:
+        failed_ids.update(get_failed_ids(batch_result))
+    seen_index.add(document_id for document_id in document_ids if document_id not in failed_ids)
+
+
+def log_batch_result(logger, batch_number: int, batch_result: dict):
+    logger.info(f"Batch {batch_number}: {batch_result['documents']} documents, "
+                f"{batch_result['inserted']} inserted, {batch_result['matched']} matched, "
+                f"{batch_result['modified']} modified, {batch_result['upserted']} upserted, "
+                f"{batch_result['retries']} retries, {len(batch_result['errors'])} errors")
+    for error in batch_result["errors"]:
+        logger.error(f"Batch {batch_number}: {error.get('errmsg')}")
+    for error in batch_result["write_concern_errors"]:
+        logger.error(f"Batch {batch_number}: write concern error {error.get('errmsg')}")
+
+
+def log_skipped_documents(logger, skipped: int):
+    if skipped:
+        logger.warning(f"Skipped {skipped} documents that the seen index holds as already sent to the target, "
+                       f"use --reset-seen-index after the collection was dropped or cleaned.")
+    else:
+        logger.info(f"Skipped no documents.")
+
+
+def spool_files(args, logger, documents):
+    # the drain adds the ids to the seen index once the mongodb acknowledged them
+    documents_spooled = 0
+    with open_spool(args) as spool:
+        for batch in create_batches(documents, args.batch_size):
+            spool.append(batch)
+            documents_spooled += len(batch)
+    logger.info(f"Spooled {documents_spooled} documents to {args.spool_directory}.")
+
+
+def drain_spool_to_mongo(args, logger) -> dict:
+    from pylibcklb.mongo.spool import drain_spool
+
+    client = create_connection_to_mongodb(args.connection_string, shared=True,
+                                          **create_pool_options(args.max_pool_size, args.min_pool_size,
+                                                                args.max_idle_time_ms))
+    db = select_database(client, args.database_name)
+    collection = select_collection(db, args.collection_name)
+    seen_index = open_seen_index(args)
+    with span("drain"):
+        summary = drain_spool(os.path.join(args.working_directory, args.spool_directory), collection,
+                              args.batch_size, args.is_replacement, args.is_upsert, args.retries,
+                              acknowledge=seen_index.add if seen_index is not None else None)
+    close_connection_to_mongodb(client)
+    if seen_index is not None:
+        seen_index.close()
+    logger.info(f"Drained {summary['documents']} documents of {summary['segments']} segments, "
+                f"{summary['rejected']} documents were rejected.")
+    if not summary["is_complete"]:
+        logger.warning(f"The connection failed, the remaining segments stay in {args.spool_directory}.")
+    return summary
+
+
+def send_files(args, logger) -> list:
+    # the bulk mode modules import bson and asyncio, they are only loaded when the bulk mode is used
+    from pylibcklb.mongo.ingestion import ingest_documents
+    from pylibcklb.mongo.rawbson import is_bson_file
+
+    filenames = collect_json_filenames(args)
+    logger.info(f"Send {len(filenames)} files in batches of {args.batch_size} documents.")
+    if args.decode_processes > 0:
+        bson_filenames = [filename for filename in filenames if is_bson_file(filename)]
+        json_filenames = [filename for filename in filenames if not is_bson_file(filename)]
+        # a partial of a module level function can be pickled to the decode processes
+        adaptation = functools.partial(apply_need_adaptations, use_content_id=args.use_content_id,
+                                       id_fields=args.id_fields)
+        documents = itertools.chain(iterate_documents(bson_filenames, args.use_content_id, args.id_fields),
+                                    iterate_data_parallel(json_filenames, adaptation, args.decode_processes,
+                                                          args.is_ordered))
+    else:
+        documents = iterate_documents(filenames, args.use_content_id, args.id_fields)
+    seen_index = open_seen_index(args)
+    # the spool mode leaves the ids to the drain
+    sent_ids = None if args.spool_directory else []
+    statistics = {"skipped": 0}
+    if seen_index is not None:
+        documents = iterate_unseen_documents(documents, seen_index, args.batch_size, sent_ids, statistics)
+    if args.spool_directory:
+        spool_files(args, logger, documents)
+        if seen_index is not None:
+            log_skipped_documents(logger, statistics["skipped"])
+            seen_index.close()
+        return []
+    client = create_connection_to_mongodb(args.connection_string, shared=True,
+                                          **create_pool_options(args.max_pool_size, args.min_pool_size,
+                                                                args.max_idle_time_ms))
+    db = select_database(client, args.database_name)
+    collection = select_collection(db, args.collection_name)
+    if args.use_async:
+        batch_results = ingest_documents(collection, documents, args.is_replacement, args.batch_size,
+                                         args.max_concurrent_batches, args.is_upsert, args.retries)
+        for batch_number, batch_result in enumerate(batch_results):
+            log_batch_result(logger, batch_number, batch_result)
+        if seen_index is not None:
+            add_acknowledged_ids(seen_index, sent_ids, batch_results)
+    else:
+        batch_results = []
+        for batch_number, batch in enumerate(create_batches(documents, args.batch_size)):
+            batch_result = run_bulk_operation_on_collection(collection, args.is_replacement, batch, args.is_upsert,
+                                                            args.retries)
+            log_batch_result(logger, batch_number, batch_result)
+            batch_results.append(batch_result)
+            if seen_index is not None:
+                # after every batch, so an aborted run does not send the acknowledged batches again
+                add_acknowledged_ids(seen_index, sent_ids, [batch_result])
+                sent_ids.clear()
+    close_connection_to_mongodb(client)
+    if seen_index is not None:
+        log_skipped_documents(logger, statistics["skipped"])
+        seen_index.close()
+    return batch_results
 
 
 def get_arguments():
@@ -90,11 +440,27 @@ def get_arguments():
 
 def main():
     arguments = get_arguments()
-    program_logger = create_logger(os.path.basename(__file__), arguments.loglevel)
+    program_logger = create_logger(os.path.basename(__file__), arguments.loglevel, arguments.use_log_queue,
+                                   arguments.log_format)
+    if arguments.metrics_filename or arguments.metrics_textfile:
+        enable_metrics()
 
-    if arguments.connection_string:
+    if not (arguments.connection_string or arguments.spool_directory):
+        program_logger.info(f"No connection string is given")
+    elif is_bulk_mode(arguments):
+        program_logger.info(f"Send data in bulk mode to the {arguments.database_name} database "
+                            f"and {arguments.collection_name} collection.")
+        send_files(arguments, program_logger)
+    elif arguments.json_filename or not arguments.is_drain:
         program_logger.info(f"Send data from file {arguments.json_filename} to the {arguments.database_name} database "
                             f"and {arguments.collection_name} collection.")
-        send_file(arguments)
-    else:
-        program_logger.info(f"No connection string is given")
+        if not send_file(arguments):
+            program_logger.warning(f"Skipped {arguments.json_filename}, the seen index holds it as already sent "
+                                   f"to the target, use --reset-seen-index after the collection was dropped.")
+    if arguments.is_drain and arguments.connection_string and arguments.spool_directory:
+        drain_spool_to_mongo(arguments, program_logger)
+    elif arguments.is_drain:
+        program_logger.error(f"The drain needs a connection string and a spool directory")
+    program_logger.debug(f"Connection pool statistics: {get_pool_statistics()}")
+    export_metrics(arguments.metrics_filename, arguments.metrics_textfile,
+                   {"script": os.path.basename(__file__)})
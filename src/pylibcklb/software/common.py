@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import struct
+import sys
+
+DPKG_STATUS_FILE = "/var/lib/dpkg/status"
+RPM_DATABASE_FILE = "/var/lib/rpm/rpmdb.sqlite"
+PYTHON_METADATA_EXTENSIONS = (".dist-info", ".egg-info")
+# see https://rpm-software-management.github.io/rpm/manual/format_header.html
+RPM_HEADER_INTRO = struct.Struct(">II")
+RPM_HEADER_ENTRY = struct.Struct(">iiii")
+RPM_STRING_TYPES = (6, 8, 9)
+RPM_INT32_TYPE = 4
+RPM_TAGS = {1000: "name", 1001: "version", 1002: "release", 1003: "epoch", 1022: "architecture"}
+
+
+def iterate_dpkg_packages(status_file: str = DPKG_STATUS_FILE):
+    """
+    Yield the installed packages of the dpkg status database
+    The file is read line by line, only the fields of the package paragraphs that are needed are kept.
+    """
+    with open(status_file, 'r', encoding="utf-8", errors="replace") as f:
+        fields = {}
+        for line in f:
+            if line.strip() == "":
+                if fields.get("Status", "").endswith(" installed"):
+                    yield {"name": fields.get("Package"), "version": fields.get("Version"),
+                           "architecture": fields.get("Architecture"), "source": "dpkg"}
+                fields = {}
+            elif not line[0].isspace():
+                # continuation lines of multi-line fields like Description start with a space
+                key, _, value = line.partition(":")
+                if key in ("Package", "Version", "Architecture", "Status"):
+                    fields[key] = value.strip()
+        if fields.get("Status", "").endswith(" installed"):
+            yield {"name": fields.get("Package"), "version": fields.get("Version"),
+                   "architecture": fields.get("Architecture"), "source": "dpkg"}
+
+
+def parse_rpm_header(blob: bytes) -> dict:
+    # a header as stored in the rpm database: index length, data length, index entries and the data store
+    number_of_entries, _ = RPM_HEADER_INTRO.unpack_from(blob, 0)
+    data_start = RPM_HEADER_INTRO.size + number_of_entries * RPM_HEADER_ENTRY.size
+    header = {}
+    for index in range(number_of_entries):
+        tag, tag_type, offset, _ = RPM_HEADER_ENTRY.unpack_from(blob, RPM_HEADER_INTRO.size +
+                                                                index * RPM_HEADER_ENTRY.size)
+        if tag not in RPM_TAGS:
+            continue
+        position = data_start + offset
+        if tag_type in RPM_STRING_TYPES:
+            header[RPM_TAGS[tag]] = blob[position:blob.index(b"\x00", position)].decode("utf-8", errors="replace")
+        elif tag_type == RPM_INT32_TYPE:
+            header[RPM_TAGS[tag]] = struct.unpack_from(">i", blob, position)[0]
+    return header
+
+
+def iterate_rpm_packages(database_file: str = RPM_DATABASE_FILE):
+    """
+    Yield the installed packages of the sqlite rpm database (rpm 4.16 and newer)
+    The headers are parsed directly, there is no rpm call per package.
+    """
+    connection = sqlite3.connect(f"file:{database_file}?mode=ro", uri=True)
+    try:
+        for blob, in connection.execute("SELECT blob FROM Packages"):
+            header = parse_rpm_header(blob)
+            version = header.get("version")
+            if "release" in header:
+                version = f"{version}-{header['release']}"
+            if header.get("epoch"):
+                version = f"{header['epoch']}:{version}"
+            yield {"name": header.get("name"), "version": version, "architecture": header.get("architecture"),
+                   "source": "rpm"}
+    finally:
+        connection.close()
+
+
+def read_python_metadata(metadata_file: str) -> dict:
+    # only the header of the metadata is read, it ends with the first empty line
+    metadata = {}
+    with open(metadata_file, 'r', encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip() == "":
+                break
+            key, _, value = line.partition(":")
+            if key in ("Name", "Version") and key not in metadata:
+                metadata[key] = value.strip()
+    return metadata
+
+
+def get_python_paths() -> list:
+    # the empty entry is the current directory and no install location
+    return [path for path in dict.fromkeys(os.path.abspath(path) for path in sys.path if path)
+            if os.path.isdir(path)]
+
+
+def iterate_python_distributions(paths: list = None):
+    """
+    Yield the python distributions installed in the paths, by default the sys.path of the interpreter
+    """
+    for path in paths if paths is not None else get_python_paths():
+        try:
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except OSError:  # pragma: no cover
+            continue
+        for entry in entries:
+            if not entry.name.endswith(PYTHON_METADATA_EXTENSIONS):
+                continue
+            if entry.is_dir():
+                metadata_file = os.path.join(entry.path, "METADATA" if entry.name.endswith(".dist-info")
+                                             else "PKG-INFO")
+            else:
+                # a single file egg-info
+                metadata_file = entry.path
+            try:
+                metadata = read_python_metadata(metadata_file)
+            except OSError:
+                continue
+            yield {"name": metadata.get("Name"), "version": metadata.get("Version"), "architecture": None,
+                   "source": "python", "path": path}
+
+
+def get_inventory_sources(dpkg_status_file: str = DPKG_STATUS_FILE, rpm_database_file: str = RPM_DATABASE_FILE,
+                          python_paths: list = None) -> dict:
+    sources = {"dpkg": [dpkg_status_file], "rpm": [rpm_database_file],
+               "python": python_paths if python_paths is not None else get_python_paths()}
+    return {source: [path for path in paths if os.path.exists(path)] for source, paths in sources.items()}
+
+
+def get_inventory_cache_key(sources: dict) -> dict:
+    # an install or removal changes the database file or adds or removes a metadata directory of a python path,
+    # both change the mtime
+    return {source: [[path, os.stat(path).st_mtime_ns] for path in paths] for source, paths in sources.items()}
+
+
+def collect_linux_software(sources: dict) -> list:
+    software_list = []
+    for dpkg_status_file in sources["dpkg"]:
+        software_list.extend(iterate_dpkg_packages(dpkg_status_file))
+    for rpm_database_file in sources["rpm"]:
+        software_list.extend(iterate_rpm_packages(rpm_database_file))
+    software_list.extend(iterate_python_distributions(sources["python"]))
+    return software_list
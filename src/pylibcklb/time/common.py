@@ -1,5 +1,95 @@
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
+UTC_OFFSET = "+00:00"
+# second => formatted date and time of the second, shared by all threads, replacing the tuple is atomic
+_second_prefix = (None, "")
+MILLISECOND_SUFFIXES = tuple(f".{milliseconds:03d}" for milliseconds in range(1000))
 
-def get_current_utc_time_ms():
-    return datetime.utcnow().isoformat(timespec='milliseconds')
+
+def get_epoch_ms() -> int:
+    return time.time_ns() // 1000000
+
+
+def get_second_prefix(epoch_sec: int) -> str:
+    # the date and time part only changes once per second, so it is formatted once per second
+    global _second_prefix
+    second, prefix = _second_prefix
+    if second != epoch_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch_sec))
+        _second_prefix = (epoch_sec, prefix)
+    return prefix
+
+
+def format_epoch_ms(epoch_ms: int, with_offset: bool = False) -> str:
+    """
+    Format milliseconds since the epoch like datetime.isoformat(timespec='milliseconds') of the UTC time
+    e.g. 1662897600123 => '2022-09-11T12:00:00.123' or with the offset '2022-09-11T12:00:00.123+00:00'
+    """
+    epoch_sec, milliseconds = divmod(epoch_ms, 1000)
+    second, prefix = _second_prefix
+    if second != epoch_sec:
+        prefix = get_second_prefix(epoch_sec)
+    if with_offset:
+        return prefix + MILLISECOND_SUFFIXES[milliseconds] + UTC_OFFSET
+    return prefix + MILLISECOND_SUFFIXES[milliseconds]
+
+
+def get_current_utc_time_ms(with_offset: bool = False) -> str:
+    return format_epoch_ms(time.time_ns() // 1000000, with_offset)
+
+
+def get_current_utc_time() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def epoch_ms_to_datetime(epoch_ms: int) -> datetime:
+    epoch_sec, milliseconds = divmod(epoch_ms, 1000)
+    return datetime.fromtimestamp(epoch_sec, timezone.utc).replace(microsecond=milliseconds * 1000)
+
+
+def stamp_documents(documents: list, field: str = "created_ms", epoch_ms: int = None) -> list:
+    # one clock read for the whole batch, all documents of a bulk write get the same stamp
+    epoch_ms = get_epoch_ms() if epoch_ms is None else epoch_ms
+    for document in documents:
+        document[field] = epoch_ms
+    return documents
+
+
+class Timer:
+    """
+    Monotonic high resolution timer for durations, not affected by changes of the system clock
+    e.g. with Timer() as timer: ... then timer.elapsed_sec
+    """
+    __slots__ = ("start_ns", "stop_ns")
+
+    def __init__(self):
+        self.start_ns = None
+        self.stop_ns = None
+
+    def start(self) -> "Timer":
+        self.start_ns = time.perf_counter_ns()
+        self.stop_ns = None
+        return self
+
+    def stop(self) -> float:
+        self.stop_ns = time.perf_counter_ns()
+        return self.elapsed_sec
+
+    @property
+    def elapsed_ns(self) -> int:
+        # a running timer returns the time up to now
+        if self.start_ns is None:
+            return 0
+        return (self.stop_ns if self.stop_ns is not None else time.perf_counter_ns()) - self.start_ns
+
+    @property
+    def elapsed_sec(self) -> float:
+        return self.elapsed_ns / 1e9
+
+    def __enter__(self) -> "Timer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
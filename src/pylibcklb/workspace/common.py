@@ -0,0 +1,228 @@
+import hashlib
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pylibcklb.cache.common import get_cache_directory, load_cache, store_cache
+
+HASH_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1024 * 1024
+# files directly in the workspace root are reported as this top-level entry
+ROOT_ENTRY = "."
+
+
+def stat_file(entry):
+    # a file of a live workspace can vanish or be unreadable between the listing and the stat
+    try:
+        stat = entry.stat(follow_symlinks=False)
+    except (FileNotFoundError, PermissionError):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_directory(root: str, relative_directory: str, ignored_names) -> tuple:
+    """
+    Collect (relative path, size, mtime in ns) of every file below the directory
+    Directories with a name of ignored_names are skipped with their content, symlinks are not followed. Files and
+    directories that vanish or can not be read during the scan are skipped and counted.
+    """
+    files = []
+    number_of_directories = 0
+    number_of_skipped = 0
+    pending = [relative_directory]
+    while pending:
+        directory = pending.pop()
+        try:
+            iterator = os.scandir(os.path.join(root, directory))
+        except (PermissionError, FileNotFoundError):
+            number_of_skipped += 1
+            continue
+        with iterator:
+            for entry in iterator:
+                relative_path = os.path.join(directory, entry.name) if directory else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ignored_names:
+                        number_of_directories += 1
+                        pending.append(relative_path)
+                elif entry.is_file(follow_symlinks=False):
+                    file_stat = stat_file(entry)
+                    if file_stat is None:
+                        number_of_skipped += 1
+                    else:
+                        files.append((relative_path, *file_stat))
+    return files, number_of_directories, number_of_skipped
+
+
+def scan_top_level_directories(root: str, ignored_names, workers: int) -> tuple:
+    # every top-level directory is walked on its own thread, os.scandir releases the GIL while it waits on the os
+    files_per_top_level = {ROOT_ENTRY: []}
+    number_of_directories = 0
+    number_of_skipped = 0
+    with os.scandir(root) as iterator:
+        entries = sorted(iterator, key=lambda entry: entry.name)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in ignored_names:
+                    number_of_directories += 1
+                    futures[entry.name] = executor.submit(scan_directory, root, entry.name, ignored_names)
+            elif entry.is_file(follow_symlinks=False):
+                file_stat = stat_file(entry)
+                if file_stat is None:
+                    number_of_skipped += 1
+                else:
+                    files_per_top_level[ROOT_ENTRY].append((entry.name, *file_stat))
+        for name, future in futures.items():
+            files_per_top_level[name], number_of_subdirectories, number_of_skipped_files = future.result()
+            number_of_directories += number_of_subdirectories
+            number_of_skipped += number_of_skipped_files
+    return files_per_top_level, number_of_directories, number_of_skipped
+
+
+def hash_file(path: str, algorithm: str = HASH_ALGORITHM) -> str:
+    file_hash = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def try_hash_file(path: str, algorithm: str = HASH_ALGORITHM):
+    # None for a file that vanished or can not be read since the scan
+    try:
+        return hash_file(path, algorithm)
+    except (FileNotFoundError, PermissionError):
+        return None
+
+
+def get_indexed_hash(index: dict, relative_path: str, size: int, mtime_ns: int):
+    entry = index.get("entries", {}).get(relative_path)
+    if entry is None or entry[0] != size or entry[1] != mtime_ns:
+        return None
+    # a file changed in the same mtime tick as the previous scan can keep its size and mtime, such racy
+    # entries are hashed again like git does it
+    if mtime_ns >= index["scan_time_ns"]:
+        return None
+    return entry[2]
+
+
+def hash_files(root: str, files: list, index: dict, workers: int, algorithm: str = HASH_ALGORITHM) -> tuple:
+    """
+    Hash the files on a thread pool, hashes of the index are reused for files with unchanged size and mtime
+    Returns the hashes by relative path, the number of files that were read and the number of files that could
+    not be read, these have no hash.
+    """
+    hashes = {}
+    pending = []
+    for relative_path, size, mtime_ns in files:
+        file_hash = get_indexed_hash(index, relative_path, size, mtime_ns)
+        if file_hash is not None:
+            hashes[relative_path] = file_hash
+        else:
+            pending.append(relative_path)
+    number_of_skipped = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for relative_path, file_hash in zip(pending, executor.map(
+                try_hash_file, [os.path.join(root, relative_path) for relative_path in pending],
+                [algorithm] * len(pending))):
+            if file_hash is None:
+                number_of_skipped += 1
+            else:
+                hashes[relative_path] = file_hash
+    return hashes, len(pending) - number_of_skipped, number_of_skipped
+
+
+def compare_with_index(files: list, index: dict) -> dict:
+    entries = index.get("entries", {})
+    changes = {"added": 0, "modified": 0, "removed": 0}
+    paths = set()
+    for relative_path, size, mtime_ns in files:
+        paths.add(relative_path)
+        entry = entries.get(relative_path)
+        if entry is None:
+            changes["added"] += 1
+        elif entry[0] != size or entry[1] != mtime_ns:
+            changes["modified"] += 1
+    changes["removed"] = sum(relative_path not in paths for relative_path in entries)
+    return changes
+
+
+def get_workspace_index_file(root: str) -> str:
+    root_hash = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_directory(), f"workspace-index-{root_hash}.json")
+
+
+def load_workspace_index(index_file: str, root: str, algorithm: str = HASH_ALGORITHM) -> dict:
+    index = load_cache(index_file, {"root": os.path.abspath(root), "algorithm": algorithm})
+    if index is None:
+        return {}
+    # stored as list, file names could collide with the Extended JSON keys of a dict
+    index["entries"] = {entry[0]: entry[1:] for entry in index["entries"]}
+    return index
+
+
+def store_workspace_index(index_file: str, root: str, files: list, hashes: dict, scan_time_ns: int,
+                          algorithm: str = HASH_ALGORITHM):
+    entries = [[relative_path, size, mtime_ns, hashes.get(relative_path)] for relative_path, size, mtime_ns in files]
+    store_cache(index_file, {"root": os.path.abspath(root), "algorithm": algorithm},
+                {"scan_time_ns": scan_time_ns, "entries": entries})
+
+
+def calculate_content_hash(hashes: dict, algorithm: str = HASH_ALGORITHM) -> str:
+    content_hash = hashlib.new(algorithm)
+    for relative_path in sorted(hashes):
+        content_hash.update(f"{relative_path}\0{hashes[relative_path]}\n".encode("utf-8"))
+    return content_hash.hexdigest()
+
+
+def scan_workspace(root: str, ignored_names=(), largest_count: int = 10, with_hashes: bool = False,
+                   workers: int = 4, index_file: str = None) -> dict:
+    """
+    Summarize the files of a workspace: counts, sizes, the largest files and a breakdown per top-level entry
+    With an index file the changes since the previous scan are reported and with_hashes only reads the files
+    whose size or mtime changed.
+    """
+    start = time.perf_counter()
+    scan_time_ns = time.time_ns()
+    ignored_names = set(ignored_names)
+    files_per_top_level, number_of_directories, number_of_skipped = scan_top_level_directories(root, ignored_names,
+                                                                                               workers)
+    files = [file for top_level_files in files_per_top_level.values() for file in top_level_files]
+
+    workspace_information = {
+        "root": os.path.abspath(root),
+        "file_count": len(files),
+        "directory_count": number_of_directories,
+        "total_size": sum(size for _, size, _ in files),
+        "skipped_files": number_of_skipped,
+        "largest_files": [{"path": relative_path, "size": size}
+                          for relative_path, size, _ in heapq.nlargest(largest_count, files, key=lambda f: f[1])],
+        "top_level": sorted(({"name": name, "file_count": len(top_level_files),
+                              "size": sum(size for _, size, _ in top_level_files)}
+                             for name, top_level_files in files_per_top_level.items() if top_level_files),
+                            key=lambda top_level: top_level["size"], reverse=True),
+    }
+
+    index = load_workspace_index(index_file, root) if index_file else {}
+    if index_file:
+        workspace_information["changes"] = compare_with_index(files, index)
+    hashes = {}
+    number_of_hashed_files = 0
+    if with_hashes:
+        hashes, number_of_hashed_files, number_of_unreadable_files = hash_files(root, files, index, workers)
+        workspace_information["hashed_files"] = number_of_hashed_files
+        workspace_information["skipped_files"] += number_of_unreadable_files
+        workspace_information["content_hash"] = calculate_content_hash(hashes)
+        for largest_file in workspace_information["largest_files"]:
+            largest_file["hash"] = hashes.get(largest_file["path"])
+    # the index of an unchanged workspace stays as it is, unless files were hashed that it has no hash for
+    if index_file and (not index or any(workspace_information["changes"].values()) or number_of_hashed_files):
+        if not with_hashes:
+            # keep the known hashes of unchanged files for the next scan with hashes
+            hashes = {relative_path: get_indexed_hash(index, relative_path, size, mtime_ns)
+                      for relative_path, size, mtime_ns in files}
+        store_workspace_index(index_file, root, files, hashes, scan_time_ns)
+    workspace_information["scan_duration_sec"] = time.perf_counter() - start
+    return workspace_information
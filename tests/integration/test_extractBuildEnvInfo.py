@@ -24,11 +24,20 @@ def test_main_mocked(mongo):
     class TestArguments:
         working_directory = os.getcwd()
         connection_string = create_connection_string(mongo.pmr_credentials)
+        spool_directory = None
         database_name = "test"
         collection_name = "test_send_data"
         json_filename = "test_data_1.json"
         is_replacement = False
+        max_pool_size = None
+        min_pool_size = None
+        max_idle_time_ms = None
         loglevel = logging.WARNING
+        use_log_queue = False
+        log_format = "text"
+        metrics_filename = None
+        metrics_textfile = None
+        embed_metrics = False
 
     test_arguments = TestArguments()
     send_information_to_mongo(test_arguments, {"system_information": None})
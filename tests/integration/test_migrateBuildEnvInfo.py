@@ -0,0 +1,27 @@
+import logging
+
+from pytest_mock_resources import create_mongo_fixture
+
+from pylibcklb.buildenv.common import render_human_readable
+from pylibcklb.mongo.common import create_connection_string, create_connection_to_mongodb
+from pylibcklb.scripts.migrateBuildEnvInfo import migrate_collection, create_argumentparser
+from tests.unit.test_buildenv_common import create_document_v2
+
+mongo = create_mongo_fixture()
+
+
+def test_migrate_collection(mongo):
+    arguments = create_argumentparser("tests").parse_args(
+        ["-conn", create_connection_string(mongo.pmr_credentials), "-cn", "test_migrate", "-b", "2", "--retries", "0"])
+    collection = create_connection_to_mongodb(arguments.connection_string)[arguments.database_name][
+        arguments.collection_name]
+    collection.insert_many([render_human_readable(create_document_v2()) for _ in range(5)] + [create_document_v2()])
+
+    migration_result = migrate_collection(arguments, logging.getLogger("tests"))
+    assert migration_result == {"documents": 5, "modified": 5, "errors": 0}
+    assert collection.count_documents({"schema_version": 2}) == 6
+    document = collection.find_one()
+    assert isinstance(document["system_information"]["cpu"]["core_usage"], list)
+
+    arguments.is_dry_run = True
+    assert migrate_collection(arguments, logging.getLogger("tests"))["documents"] == 0
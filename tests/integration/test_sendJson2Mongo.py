@@ -1,25 +1,22 @@
+import logging
 import os
+import tempfile
 
+import bson
 from bson import ObjectId
 from pytest_mock_resources import create_mongo_fixture
 
 from pylibcklb.json.common import create_json_file
 from pylibcklb.mongo.common import create_connection_string
-from pylibcklb.scripts.sendJson2Mongo import send_file
+from pylibcklb.scripts.sendJson2Mongo import send_file, send_files, create_argumentparser
 
 mongo = create_mongo_fixture()
 
 
 def test_send_data(mongo):
-    class TestArguments:
-        working_directory = os.getcwd()
-        connection_string = create_connection_string(mongo.pmr_credentials)
-        database_name = "test"
-        collection_name = "test_send_data"
-        json_filename = "test_data_1.json"
-        is_replacement = False
-
-    arguments = TestArguments()
+    arguments = create_argumentparser("tests").parse_args(
+        ["-conn", create_connection_string(mongo.pmr_credentials), "-db", "test", "-cn", "test_send_data",
+         "-json-filename", "test_data_1.json"])
 
     common_document_id = str(ObjectId())
 
@@ -43,3 +40,48 @@ def test_send_data(mongo):
     create_json_file(arguments.working_directory, arguments.json_filename, test_file_content_2)
     send_file(arguments)
     os.remove(os.path.join(arguments.working_directory, arguments.json_filename))
+
+
+def test_send_files(mongo):
+    with tempfile.TemporaryDirectory() as working_directory:
+        for i in range(5):
+            create_json_file(working_directory, f"result_{i}.json", {"_id": str(ObjectId()), "data": i})
+
+        args = create_argumentparser("tests").parse_args(
+            ["-conn", create_connection_string(mongo.pmr_credentials), "-db", "test", "-cn", "test_send_files",
+             "-json-directory", ".", "-b", "2", "-w", working_directory])
+        batch_results = send_files(args, logging.getLogger("tests"))
+
+    assert sum(batch_result["inserted"] for batch_result in batch_results) == 5
+    assert all(not batch_result["errors"] for batch_result in batch_results)
+
+
+def test_send_files_upsert(mongo):
+    with tempfile.TemporaryDirectory() as working_directory:
+        create_json_file(working_directory, "records.json",
+                         [{"_id": str(ObjectId()), "data": i} for i in range(5)])
+
+        args = create_argumentparser("tests").parse_args(
+            ["-conn", create_connection_string(mongo.pmr_credentials), "-db", "test", "-cn", "test_send_files_upsert",
+             "-json-filenames", "records.json", "-b", "2", "-r", "-u", "-w", working_directory])
+        batch_results = send_files(args, logging.getLogger("tests"))
+        assert sum(batch_result["upserted"] for batch_result in batch_results) == 5
+
+        batch_results = send_files(args, logging.getLogger("tests"))
+        assert sum(batch_result["matched"] for batch_result in batch_results) == 5
+        assert sum(batch_result["upserted"] for batch_result in batch_results) == 0
+
+
+def test_send_files_bson(mongo):
+    with tempfile.TemporaryDirectory() as working_directory:
+        with open(os.path.join(working_directory, "dump.bson"), "wb") as f:
+            for i in range(5):
+                f.write(bson.encode({"data": i}))
+        create_json_file(working_directory, "result.json", {"data": 5})
+
+        args = create_argumentparser("tests").parse_args(
+            ["-conn", create_connection_string(mongo.pmr_credentials), "-db", "test", "-cn", "test_send_files_bson",
+             "-json-directory", ".", "-b", "4", "-w", working_directory])
+        batch_results = send_files(args, logging.getLogger("tests"))
+
+    assert sum(batch_result["inserted"] for batch_result in batch_results) == 6
@@ -0,0 +1,70 @@
+import copy
+import unittest
+from datetime import datetime, timezone
+
+from pylibcklb.buildenv.common import render_human_readable, migrate_document, SCHEMA_VERSION
+
+
+def create_document_v2() -> dict:
+    return {
+        "system_information": {
+            "node_name": "agent-1",
+            "boot_time": datetime.fromtimestamp(1660000000, timezone.utc),
+            "boot_time_sec": 1660000000.0,
+            "cpu": {"cores_physical": 2, "cores_total": 4, "frequency_max": 2400.0, "frequency_min": 800.0,
+                    "frequency_current": 1600.5, "core_usage": [12.5, 0.0, 100.0, 37.5], "core_usage_all": 37.5},
+            "memory": {"total": 17179869184, "available": 8589934592, "used": 1073741824, "percentage": 50.0,
+                       "swap": {"total": 2147483648, "free": 2147483648, "used": 0, "percentage": 0.0}},
+            "disk": {"partitions": [{"device": "/dev/sda1", "mountpoint": "/", "fstype": "ext4",
+                                     "total_size": 107374182400, "used": 53687091200, "free": 53687091200,
+                                     "percentage": 50.0}],
+                     "total_read": 1048576, "total_write": 2097152},
+            "network": {"interfaces": [], "bytes_sent": 1024, "bytes_received": 512},
+        },
+        "workspace_information": {},
+        "schema_version": SCHEMA_VERSION,
+    }
+
+
+class Test(unittest.TestCase):
+
+    def test_render_human_readable(self):
+        document = create_document_v2()
+        rendered = render_human_readable(document)
+        system_information = rendered["system_information"]
+        assert rendered["schema_version"] == 1
+        assert system_information["cpu"]["frequency_current"] == "1600.50Mhz"
+        assert [key for key in system_information["cpu"] if key.startswith("core_usage")] == \
+               ["core_usage_0", "core_usage_1", "core_usage_2", "core_usage_3", "core_usage_all"]
+        assert system_information["cpu"]["core_usage_3"] == "37.5%"
+        assert system_information["memory"]["total"] == "16.00GB"
+        assert system_information["memory"]["swap"]["used"] == "0.00B"
+        assert system_information["disk"]["partitions"][0]["total_size"] == "100.00GB"
+        assert system_information["disk"]["partitions"][0]["device"] == "/dev/sda1"
+        assert system_information["network"]["bytes_sent"] == "1.00KB"
+        assert isinstance(system_information["boot_time"], str)
+        # the presentation layer does not change the raw document
+        assert document == create_document_v2()
+
+    def test_migrate_document(self):
+        document = create_document_v2()
+        migrated = migrate_document(render_human_readable(document))
+        assert migrated == document
+        assert list(migrated["system_information"]["cpu"]) == list(document["system_information"]["cpu"])
+
+    def test_migrate_document_is_idempotent(self):
+        document = create_document_v2()
+        assert migrate_document(copy.deepcopy(document)) == document
+
+    def test_migrate_document_without_schema_version(self):
+        migrated = migrate_document({"system_information": {}, "workspace_information": {}})
+        assert migrated == {"system_information": {}, "workspace_information": {}, "schema_version": SCHEMA_VERSION}
+
+    def test_render_human_readable_workspace_information(self):
+        rendered = render_human_readable({"workspace_information": {
+            "file_count": 2, "total_size": 2048, "largest_files": [{"path": "data.bin", "size": 1024}],
+            "top_level": [{"name": ".", "file_count": 2, "size": 2048}]}})
+        assert rendered["workspace_information"]["file_count"] == 2
+        assert rendered["workspace_information"]["total_size"] == "2.00KB"
+        assert rendered["workspace_information"]["largest_files"][0]["size"] == "1.00KB"
+        assert rendered["workspace_information"]["top_level"][0]["size"] == "2.00KB"
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pylibcklb.cache.common import get_cache_directory, load_cache, store_cache, invalidate_cache
+
+
+class Test(unittest.TestCase):
+
+    def test_get_cache_directory(self):
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": "/tmp/cache"}):
+            assert get_cache_directory() == os.path.join("/tmp/cache", "pylibcklb")
+
+    def test_store_and_load_cache(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            cache_file = os.path.join(working_directory, "sub", "cache.json")
+            assert load_cache(cache_file, {"host": "agent"}) is None
+            store_cache(cache_file, {"host": "agent"}, {"facts": [1, 2]})
+            assert load_cache(cache_file, {"host": "agent"}) == {"facts": [1, 2]}
+            assert load_cache(cache_file, {"host": "other"}) is None
+
+    def test_load_broken_cache(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            cache_file = os.path.join(working_directory, "cache.json")
+            for content in ["{broken", "[1, 2]"]:
+                with open(cache_file, "w") as f:
+                    f.write(content)
+                assert load_cache(cache_file, "key") is None
+
+    def test_invalidate_cache(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            cache_file = os.path.join(working_directory, "cache.json")
+            store_cache(cache_file, "key", "value")
+            invalidate_cache(cache_file)
+            invalidate_cache(cache_file)
+            assert load_cache(cache_file, "key") is None
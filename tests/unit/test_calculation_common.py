@@ -1,6 +1,7 @@
 import unittest
 
-from pylibcklb.calculation.common import get_size
+from pylibcklb.calculation.common import get_size, calculate_rates, parse_size, parse_percentage, \
+    format_percentage, parse_frequency, format_frequency
 
 
 class Test(unittest.TestCase):
@@ -37,3 +38,29 @@ class Test(unittest.TestCase):
 
     def test_get_size_number_to_big(self):
         assert get_size(1999599627776000) == None
+
+    def test_calculate_rates(self):
+        rates = calculate_rates({"read": 100, "write": 50}, {"read": 300, "write": 50, "new": 10}, 2.0)
+        assert rates == {"read": 100.0, "write": 0.0}
+
+    def test_calculate_rates_counter_reset(self):
+        assert calculate_rates({"sent": 1000}, {"sent": 10}, 1.0) == {"sent": 0.0}
+        assert calculate_rates({"sent": 10}, {"sent": 20}, 0.0) == {"sent": 0.0}
+
+    def test_parse_size(self):
+        assert parse_size("512.00B") == 512
+        assert parse_size("1.00KB") == 1024
+        assert parse_size("100.00GB") == 107374182400
+        assert parse_size(get_size(1253656)) == 1258291
+        assert parse_size("None") is None
+        assert parse_size(1024) == 1024
+
+    def test_parse_size_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_size("1.00XB")
+
+    def test_parse_percentage_and_frequency(self):
+        assert parse_percentage(format_percentage(37.5)) == 37.5
+        assert parse_frequency(format_frequency(2400)) == 2400.0
+        with self.assertRaises(ValueError):
+            parse_frequency("2400.00GHz")
@@ -0,0 +1,159 @@
+import random
+import statistics
+import unittest
+from unittest.mock import patch
+
+from pylibcklb.calculation.statistics import RunningStatistics, LogHistogram, ExponentiallyWeightedAverage, \
+    ExponentiallyWeightedRate, HAS_NUMPY
+
+
+def create_values(count: int = 10000, seed: int = 0) -> list:
+    generator = random.Random(seed)
+    return [generator.lognormvariate(3, 1) for _ in range(count)]
+
+
+def get_exact_quantile(values: list, q: float) -> float:
+    return sorted(values)[round(q * (len(values) - 1))]
+
+
+class Test(unittest.TestCase):
+
+    def test_running_statistics(self):
+        values = create_values(1000)
+        running_statistics = RunningStatistics()
+        for value in values:
+            running_statistics.update(value)
+        assert running_statistics.count == 1000
+        self.assertAlmostEqual(running_statistics.mean, statistics.fmean(values))
+        self.assertAlmostEqual(running_statistics.variance, statistics.pvariance(values))
+        self.assertAlmostEqual(running_statistics.sample_variance, statistics.variance(values))
+        self.assertAlmostEqual(running_statistics.standard_deviation, statistics.pstdev(values))
+        assert running_statistics.minimum == min(values)
+        assert running_statistics.maximum == max(values)
+
+    def test_running_statistics_empty(self):
+        running_statistics = RunningStatistics()
+        assert running_statistics.variance == 0.0
+        assert running_statistics.sample_variance == 0.0
+        assert running_statistics.minimum is None
+
+    def test_running_statistics_merge(self):
+        values = create_values(1000)
+        merged = RunningStatistics()
+        for part in [values[:10], values[10:600], [], values[600:]]:
+            running_statistics = RunningStatistics()
+            for value in part:
+                running_statistics.update(value)
+            merged.merge(RunningStatistics.from_dict(running_statistics.to_dict()))
+        assert merged.count == 1000
+        self.assertAlmostEqual(merged.mean, statistics.fmean(values))
+        self.assertAlmostEqual(merged.variance, statistics.pvariance(values))
+        assert merged.minimum == min(values)
+        assert merged.maximum == max(values)
+
+    def test_running_statistics_update_batch(self):
+        values = create_values(1000)
+        running_statistics = RunningStatistics()
+        running_statistics.update_batch(values[:500])
+        running_statistics.update_batch([])
+        running_statistics.update_batch(values[500:])
+        assert running_statistics.count == 1000
+        self.assertAlmostEqual(running_statistics.mean, statistics.fmean(values))
+        self.assertAlmostEqual(running_statistics.variance, statistics.pvariance(values))
+
+    @unittest.skipUnless(HAS_NUMPY, "needs numpy")
+    def test_running_statistics_update_batch_without_numpy(self):
+        values = create_values(1000)
+        vectorized = RunningStatistics()
+        vectorized.update_batch(values)
+        with patch("pylibcklb.calculation.statistics.HAS_NUMPY", False):
+            looped = RunningStatistics()
+            looped.update_batch(values)
+        self.assertAlmostEqual(vectorized.mean, looped.mean)
+        self.assertAlmostEqual(vectorized.variance, looped.variance)
+
+    def test_log_histogram_quantiles(self):
+        values = create_values()
+        histogram = LogHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.update(value)
+        assert histogram.count == len(values)
+        for q in [0.0, 0.01, 0.25, 0.5, 0.9, 0.99, 1.0]:
+            exact = get_exact_quantile(values, q)
+            assert abs(histogram.quantile(q) - exact) <= 0.01 * exact, q
+        assert histogram.quantile(0.0) == min(values)
+        assert histogram.quantile(1.0) == max(values)
+        # a few hundred buckets instead of the raw values
+        assert len(histogram.bins) < 1000
+
+    def test_log_histogram_zero_values(self):
+        histogram = LogHistogram()
+        for value in [0.0, 0.0, 0.0, 50.0]:
+            histogram.update(value)
+        assert histogram.quantile(0.5) == 0.0
+        assert histogram.quantile(1.0) == 50.0
+
+    def test_log_histogram_invalid(self):
+        with self.assertRaises(ValueError):
+            LogHistogram(relative_accuracy=1.5)
+        histogram = LogHistogram()
+        assert histogram.quantile(0.5) is None
+        with self.assertRaises(ValueError):
+            histogram.update(-1.0)
+        with self.assertRaises(ValueError):
+            histogram.quantile(2)
+        with self.assertRaises(ValueError):
+            histogram.merge(LogHistogram(relative_accuracy=0.05))
+
+    def test_log_histogram_merge(self):
+        values = create_values()
+        merged = LogHistogram()
+        for part in [values[:3000], values[3000:], []]:
+            histogram = LogHistogram()
+            histogram.update_batch(part)
+            merged.merge(LogHistogram.from_dict(histogram.to_dict()))
+        single = LogHistogram()
+        for value in values:
+            single.update(value)
+        assert merged.count == single.count
+        assert merged.bins == single.bins
+        assert merged.quantile(0.99) == single.quantile(0.99)
+
+    @unittest.skipUnless(HAS_NUMPY, "needs numpy")
+    def test_log_histogram_update_batch_without_numpy(self):
+        values = create_values() + [0.0]
+        vectorized = LogHistogram()
+        vectorized.update_batch(values)
+        with patch("pylibcklb.calculation.statistics.HAS_NUMPY", False):
+            looped = LogHistogram()
+            looped.update_batch(values)
+        assert vectorized.to_dict() == looped.to_dict()
+
+    def test_log_histogram_to_update(self):
+        histogram = LogHistogram()
+        for value in [0.0, 1.0, 1.0, 100.0]:
+            histogram.update(value)
+        update = histogram.to_update("cpu_usage")
+        assert update["$inc"]["cpu_usage.count"] == 4
+        assert update["$inc"]["cpu_usage.zero_count"] == 1
+        assert update["$inc"]["cpu_usage.bins.0"] == 2
+        assert update["$inc"][f"cpu_usage.bins.{histogram.get_bucket_index(100.0)}"] == 1
+        assert update["$min"] == {"cpu_usage.minimum": 0.0}
+        assert update["$max"] == {"cpu_usage.maximum": 100.0}
+        assert "$min" not in LogHistogram().to_update("cpu_usage")
+
+    def test_exponentially_weighted_average(self):
+        average = ExponentiallyWeightedAverage(half_life_sec=10)
+        assert average.update(100.0, 0.0) == 100.0
+        # after one half life the new value has half of the weight
+        assert average.update(0.0, 10.0) == 50.0
+        assert average.update(0.0, 10.0) == 50.0
+
+    def test_exponentially_weighted_rate(self):
+        rate = ExponentiallyWeightedRate(half_life_sec=10)
+        assert rate.update(1000, 0.0) is None
+        assert rate.update(2000, 10.0) == 100.0
+        assert rate.update(4000, 20.0) == 150.0
+        # a reset of the counter
+        assert rate.update(0, 30.0) == 75.0
+        assert rate.value == 75.0
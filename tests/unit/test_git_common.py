@@ -0,0 +1,108 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+from pylibcklb.git.common import parse_status_porcelain_v2, parse_ls_tree, get_git_information
+
+
+def run_git(directory: str, *arguments):
+    subprocess.run(["git", "-c", "user.name=tests", "-c", "user.email=tests@example.com",
+                    "-c", "protocol.file.allow=always", *arguments], cwd=directory, check=True,
+                   capture_output=True)
+
+
+def create_repository(directory: str, filename: str = "README.md"):
+    run_git(directory, "init", "-b", "main")
+    with open(os.path.join(directory, filename), 'w') as f:
+        f.write("tests")
+    run_git(directory, "add", filename)
+    run_git(directory, "commit", "-m", "Initial commit")
+
+
+class Test(unittest.TestCase):
+
+    def test_parse_status_porcelain_v2(self):
+        output = "\0".join([
+            "# branch.oid 1234567890abcdef1234567890abcdef12345678",
+            "# branch.head main",
+            "# branch.upstream origin/main",
+            "# branch.ab +2 -3",
+            "1 M. N... 100644 100644 100644 aaaa bbbb staged file.py",
+            "1 .M N... 100644 100644 100644 aaaa aaaa changed.py",
+            "2 R. N... 100644 100644 100644 aaaa aaaa R100 new name.py", "old name.py",
+            "1 .M SC.. 160000 160000 160000 cccc cccc libs/sub",
+            "u UU N... 100644 100644 100644 100644 aaaa bbbb cccc conflict.py",
+            "? untracked.py",
+            ""])
+        status = parse_status_porcelain_v2(output)
+        assert status["commit"] == "1234567890abcdef1234567890abcdef12345678"
+        assert status["branch"] == "main"
+        assert status["upstream"] == "origin/main"
+        assert (status["ahead"], status["behind"]) == (2, 3)
+        assert status["staged_files"] == 2
+        assert status["changed_files"] == 2
+        assert status["unmerged_files"] == 1
+        assert status["untracked_files"] == 1
+        assert status["submodules"] == {"libs/sub": {"commit_changed": True, "modified": False, "untracked": False}}
+
+    def test_parse_status_porcelain_v2_detached_initial(self):
+        status = parse_status_porcelain_v2("# branch.oid (initial)\0# branch.head (detached)\0")
+        assert status["commit"] is None
+        assert status["branch"] is None
+        assert status["is_detached"]
+
+    def test_parse_ls_tree(self):
+        output = "160000 commit abcd\tlibs/sub\x00100644 blob ef01\twith\ttab.txt\x00"
+        assert parse_ls_tree(output) == {"libs/sub": ("160000", "abcd"), "with\ttab.txt": ("100644", "ef01")}
+
+    def test_get_git_information(self):
+        with tempfile.TemporaryDirectory() as directory:
+            submodule_directory = os.path.join(directory, "submodule")
+            repository_directory = os.path.join(directory, "repository")
+            os.makedirs(submodule_directory)
+            os.makedirs(repository_directory)
+            create_repository(submodule_directory)
+            create_repository(repository_directory)
+            run_git(repository_directory, "submodule", "add", submodule_directory, "libs/sub")
+            run_git(repository_directory, "commit", "-m", "Add the submodule")
+            with open(os.path.join(repository_directory, "README.md"), 'w') as f:
+                f.write("changed")
+            with open(os.path.join(repository_directory, "untracked.txt"), 'w') as f:
+                f.write("untracked")
+            os.makedirs(os.path.join(repository_directory, "src"))
+
+            git_information = get_git_information(os.path.join(repository_directory, "src"))
+            assert git_information["branch"] == "main"
+            assert git_information["is_dirty"]
+            assert git_information["changed_files"] == 1
+            assert "untracked_files" not in git_information
+            assert git_information["summary"] == "Add the submodule"
+            submodule_commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=submodule_directory,
+                                              check=True, capture_output=True, text=True).stdout.strip()
+            assert git_information["submodules"] == [{"path": "libs/sub", "commit": submodule_commit,
+                                                      "commit_changed": False, "modified": False,
+                                                      "untracked": False}]
+            assert get_git_information(repository_directory, untracked_files=True)["untracked_files"] == 1
+
+    def test_get_git_information_empty_repository(self):
+        with tempfile.TemporaryDirectory() as directory:
+            run_git(directory, "init", "-b", "main")
+            git_information = get_git_information(directory)
+            assert git_information["commit"] is None
+            assert git_information["branch"] == "main"
+            assert not git_information["is_dirty"]
+            assert git_information["submodules"] == []
+
+    def test_get_git_information_gitmodules_without_paths(self):
+        with tempfile.TemporaryDirectory() as directory:
+            create_repository(directory, ".gitmodules")
+            assert get_git_information(directory)["submodules"] == []
+
+    def test_get_git_information_without_gitpython(self):
+        with patch("pylibcklb.git.common.git", None):
+            with pytest.raises(ImportError):
+                get_git_information(os.path.dirname(__file__))
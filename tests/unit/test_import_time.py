@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from pylibcklb.scripts import SCRIPT_MODULES, HEAVY_MODULES
+
+
+def run_python(*arguments) -> subprocess.CompletedProcess:
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    return subprocess.run([sys.executable, *arguments], capture_output=True, text=True, env=environment)
+
+
+def get_loaded_heavy_modules(code: str) -> list:
+    process = run_python("-c", f"{code}\nimport sys\n"
+                               f"print('heavy modules:', ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    assert process.returncode == 0, process.stderr
+    # the last line, the output of --help comes before it
+    heavy_modules = process.stdout.splitlines()[-1][len("heavy modules: "):]
+    return [name for name in heavy_modules.split(",") if name]
+
+
+class Test(unittest.TestCase):
+
+    def test_scripts_do_not_import_heavy_modules(self):
+        for module in SCRIPT_MODULES:
+            assert get_loaded_heavy_modules(f"import {module}") == [], module
+
+    def test_help_does_not_import_heavy_modules(self):
+        for module in SCRIPT_MODULES:
+            code = f"import sys\nsys.argv = ['tests', '--help']\nfrom {module} import main\n" \
+                   f"try:\n    main()\nexcept SystemExit:\n    pass"
+            assert get_loaded_heavy_modules(code) == [], module
+
@@ -1,12 +1,31 @@
+import gzip
+import json
 import os
+import tempfile
 import unittest
+from datetime import datetime
+from types import MappingProxyType
+from unittest.mock import patch
 
-from bson import ObjectId
+from bson import ObjectId, Int64, Decimal128, Binary, Timestamp, DBRef, MinKey, MaxKey, Regex
+from bson.json_util import dumps, loads
 
-from pylibcklb.json.common import create_json_file, load_data
+from pylibcklb.json.common import create_json_file, load_data, iterate_data, iterate_data_parallel, \
+    load_file_documents, decode_json, encode_json, convert_extended_json, JSON_BACKENDS, write_json_file, \
+    iterate_json_chunks, COMPRESSIONS, HAS_ZSTANDARD, append_json_lines, create_file_parts, load_file_part
+from pylibcklb.mongo.common import check_schema_version
 from pylibcklb.time.common import get_current_utc_time_ms
 
 
+def create_extended_json_document() -> dict:
+    return {"_id": ObjectId(), "schema_version": Int64(2), "date": datetime(2022, 9, 11, 12, 0, 0, 123000),
+            "old_date": datetime(1900, 1, 1), "decimal": Decimal128("1.5"), "binary": Binary(b"data"),
+            "timestamp": Timestamp(1, 2), "reference": DBRef("collection", ObjectId()), "min": MinKey(),
+            "max": MaxKey(), "regex": Regex("^build", "i"), "big_number": 2 ** 70, "float": 1e16,
+            "not_a_number": float("inf"), "tuple": (1, 2),
+            "nested": {"list": [{"date": datetime(2020, 1, 1)}, [ObjectId()]], "$comment": "unknown operator"}}
+
+
 class Test(unittest.TestCase):
 
     def test_read_and_write(self):
@@ -16,3 +35,215 @@ class Test(unittest.TestCase):
         data_new = load_data(os.getcwd(), json_filename)
         assert data_new == data_origin
         os.remove(os.path.join(os.getcwd(), json_filename))
+
+    def test_iterate_data_ndjson(self):
+        documents = [{"_id": ObjectId(), "date": datetime(2022, 9, 11, 12, 0), "index": i} for i in range(10)]
+        with tempfile.TemporaryDirectory() as working_directory:
+            with open(os.path.join(working_directory, "test.ndjson"), "w") as f:
+                f.write("\n".join(dumps(document) for document in documents) + "\n")
+            for chunk_size in [1, 16, 1024]:
+                assert list(iterate_data(working_directory, "test.ndjson", chunk_size)) == documents
+
+    def test_iterate_data_array(self):
+        documents = [{"_id": ObjectId(), "values": [1, 22, 333], "index": i} for i in range(10)]
+        with tempfile.TemporaryDirectory() as working_directory:
+            with open(os.path.join(working_directory, "test.json"), "w") as f:
+                f.write(dumps(documents, indent=2))
+            for chunk_size in [1, 16, 1024]:
+                assert list(iterate_data(working_directory, "test.json", chunk_size)) == documents
+
+    def test_iterate_data_matches_load_data(self):
+        data_origin = {"_id": ObjectId(), "date": get_current_utc_time_ms(), "number": 123456}
+        with tempfile.TemporaryDirectory() as working_directory:
+            create_json_file(working_directory, "test.json", data_origin)
+            assert list(iterate_data(working_directory, "test.json", 2)) == [load_data(working_directory, "test.json")]
+
+    def test_iterate_data_empty_file(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            open(os.path.join(working_directory, "test.json"), "w").close()
+            assert list(iterate_data(working_directory, "test.json")) == []
+
+    def test_iterate_data_broken_files(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            for content in ["[1, 2", '{"data": ']:
+                with open(os.path.join(working_directory, "test.json"), "w") as f:
+                    f.write(content)
+                with self.assertRaises(json.JSONDecodeError):
+                    list(iterate_data(working_directory, "test.json", 2))
+
+    def test_load_file_documents(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            create_json_file(working_directory, "test.json", [{"index": 1}, {"index": 2}])
+            filename = os.path.join(working_directory, "test.json")
+            assert load_file_documents(filename) == [{"index": 1}, {"index": 2}]
+            assert load_file_documents(filename, check_schema_version) == \
+                   [{"index": 1, "schema_version": 1}, {"index": 2, "schema_version": 1}]
+
+    def test_iterate_data_parallel(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            filenames = []
+            for i in range(12):
+                create_json_file(working_directory, f"test_{i}.json", [{"_id": ObjectId(), "file": i, "index": 0},
+                                                                        {"_id": ObjectId(), "file": i, "index": 1}])
+                filenames.append(os.path.join(working_directory, f"test_{i}.json"))
+
+            documents = list(iterate_data_parallel(filenames, check_schema_version, workers=2))
+            assert [(document["file"], document["index"]) for document in documents] == \
+                   [(i, j) for i in range(12) for j in range(2)]
+            assert all(document["schema_version"] == 1 for document in documents)
+
+            documents = list(iterate_data_parallel(filenames, workers=2, ordered=False))
+            assert sorted((document["file"], document["index"]) for document in documents) == \
+                   [(i, j) for i in range(12) for j in range(2)]
+
+    def test_create_file_parts(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            documents = [{"_id": ObjectId(), "index": i, "text": "x" * (i % 7)} for i in range(100)]
+            append_json_lines(working_directory, "test.json", documents)
+            filename = os.path.join(working_directory, "test.json")
+            parts = create_file_parts(filename, part_size=64)
+            assert len(parts) == -(-os.path.getsize(filename) // 64)
+            # every line is decoded by the part it starts in
+            assert [document for part in parts for document in load_file_part(*part)] == documents
+            assert create_file_parts(filename) == [(filename, 0, None)]
+
+            # pretty printed documents, arrays and compressed files are not split
+            with open(os.path.join(working_directory, "pretty.json"), 'w') as f:
+                json.dump({"data": list(range(100))}, f, indent=4)
+            create_json_file(working_directory, "array.json", documents)
+            append_json_lines(working_directory, "test.json.gz", documents, "gzip")
+            for name in ["pretty.json", "array.json", "test.json.gz"]:
+                filename = os.path.join(working_directory, name)
+                assert create_file_parts(filename, part_size=64) == [(filename, 0, None)]
+
+    def test_iterate_data_parallel_splits_files(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            documents = [{"_id": ObjectId(), "index": i} for i in range(200)]
+            append_json_lines(working_directory, "test.json", documents)
+            filenames = [os.path.join(working_directory, "test.json")]
+            assert list(iterate_data_parallel(filenames, workers=2, part_size=256)) == documents
+
+    def test_encode_json_matches_bson_json_util(self):
+        data_origin = create_extended_json_document()
+        for backend in JSON_BACKENDS:
+            assert encode_json(data_origin, backend) == dumps(data_origin)
+
+    def test_decode_json_matches_bson_json_util(self):
+        text = dumps(create_extended_json_document())
+        for backend in JSON_BACKENDS:
+            assert decode_json(text, backend) == loads(text)
+            assert decode_json(text.encode(), backend) == loads(text)
+
+    def test_decode_json_fallback_of_fast_backend(self):
+        for text in ['{"value": NaN}', '{"value": 123456789012345678901234567890}']:
+            assert str(decode_json(text, "orjson")) == str(loads(text))
+
+    def test_decode_json_integers_outside_of_int64(self):
+        for text in ['-9223372036854775809', '[-9223372036854775809]', '-9999999999999999999',
+                     '{"value": 18446744073709551616}', '9223372036854775807']:
+            for backend in JSON_BACKENDS:
+                assert decode_json(text, backend) == loads(text)
+                assert decode_json(text.encode(), backend) == loads(text)
+                assert type(decode_json(text.encode(), backend)) is type(loads(text))
+        assert decode_json(b'-9223372036854775809') == -9223372036854775809
+
+    def test_convert_extended_json(self):
+        document_id = ObjectId()
+        assert json.loads(f'[{{"_id": {{"$oid": "{document_id}"}}}}, 1]', object_hook=convert_extended_json) == \
+               [{"_id": document_id}, 1]
+        assert convert_extended_json({"count": {"$numberLong": "5"}}) == {"count": {"$numberLong": "5"}}
+        assert convert_extended_json({"$numberLong": "5"}) == 5
+        assert convert_extended_json({"$comment": "text"}) == {"$comment": "text"}
+
+    def test_encode_json_of_other_containers(self):
+        data_origin = {"mapping": MappingProxyType({"a": 1}), "set": {2}, "range": range(3)}
+        for backend in JSON_BACKENDS:
+            assert encode_json(data_origin, backend) == dumps(data_origin)
+
+    def test_read_and_write_with_backends(self):
+        data_origin = create_extended_json_document()
+        with tempfile.TemporaryDirectory() as working_directory:
+            for backend in JSON_BACKENDS:
+                create_json_file(working_directory, "test.json", data_origin, backend)
+                assert load_data(working_directory, "test.json", backend) == \
+                       load_data(working_directory, "test.json", "bson")
+
+    def test_iterate_json_chunks(self):
+        data_origin = create_extended_json_document()
+        data_origin["deep"] = {"a": {"b": {"c": [1, {"d": 2}]}}, "e": []}
+        data_origin["mapping"] = {1: "integer key"}
+        for depth in range(5):
+            assert "".join(iterate_json_chunks(data_origin, depth)) == dumps(data_origin)
+
+    def test_write_json_file(self):
+        data_origin = {"_id": ObjectId(), "date": datetime(2022, 9, 11), "values": list(range(100))}
+        with tempfile.TemporaryDirectory() as working_directory:
+            write_json_file(working_directory, "test.json", {"data": "old content"})
+            write_json_file(working_directory, "test.json", data_origin)
+            with open(os.path.join(working_directory, "test.json")) as f:
+                assert f.read() == dumps(data_origin)
+            assert os.listdir(working_directory) == ["test.json"]
+
+    def test_write_json_file_compressed(self):
+        data_origin = {"_id": ObjectId(), "date": datetime(2022, 9, 11), "values": list(range(100))}
+        with tempfile.TemporaryDirectory() as working_directory:
+            for compression, extension in [("gzip", ".gz"), ("zstd", ".zst")]:
+                if compression == "zstd" and not HAS_ZSTANDARD:  # pragma: no cover
+                    continue
+                write_json_file(working_directory, f"test.json{extension}", data_origin, compression)
+                assert list(iterate_data(working_directory, f"test.json{extension}")) == [data_origin]
+            with gzip.open(os.path.join(working_directory, "test.json.gz"), "rt") as f:
+                assert f.read() == dumps(data_origin)
+
+    def test_write_json_file_append(self):
+        documents = [{"_id": ObjectId(), "index": i} for i in range(3)]
+        with tempfile.TemporaryDirectory() as working_directory:
+            for compression in [None] + COMPRESSIONS:
+                if compression == "zstd" and not HAS_ZSTANDARD:  # pragma: no cover
+                    continue
+                json_filename = f"test_{compression}.ndjson"
+                if compression:
+                    json_filename += ".gz" if compression == "gzip" else ".zst"
+                for document in documents:
+                    write_json_file(working_directory, json_filename, document, compression, append=True)
+                assert list(iterate_data(working_directory, json_filename)) == documents
+
+    def test_append_json_lines(self):
+        documents = [{"_id": ObjectId(), "index": i} for i in range(3)]
+        with tempfile.TemporaryDirectory() as working_directory:
+            append_json_lines(working_directory, "test.ndjson.gz", documents[:2], "gzip")
+            append_json_lines(working_directory, "test.ndjson.gz", documents[2:], "gzip")
+            assert list(iterate_data(working_directory, "test.ndjson.gz")) == documents
+
+    def test_write_json_file_keeps_old_file_on_failure(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            write_json_file(working_directory, "test.json", {"data": "old content"})
+            with patch("pylibcklb.json.common.encode_json", side_effect=RuntimeError("crash")):
+                with self.assertRaises(RuntimeError):
+                    write_json_file(working_directory, "test.json", {"data": "new content"})
+            assert load_data(working_directory, "test.json") == {"data": "old content"}
+            assert os.listdir(working_directory) == ["test.json"]
+
+    @patch("pylibcklb.json.common._new_file_mode", None)
+    def test_write_json_file_honors_umask(self):
+        umask = os.umask(0o027)
+        try:
+            with tempfile.TemporaryDirectory() as working_directory:
+                write_json_file(working_directory, "test.json", {"data": "tests"})
+                create_json_file(working_directory, "reference.json", {"data": "tests"})
+                # the same mode as a file created by open, not the 0600 of mkstemp
+                assert os.stat(os.path.join(working_directory, "test.json")).st_mode & 0o777 == 0o640
+                assert os.stat(os.path.join(working_directory, "reference.json")).st_mode & 0o777 == 0o640
+        finally:
+            os.umask(umask)
+
+    def test_write_json_file_unknown_compression(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with self.assertRaises(ValueError):
+                write_json_file(working_directory, "test.json", {}, "bzip2")
+
+    def test_write_json_file_missing_zstandard(self):
+        with patch("pylibcklb.json.common.HAS_ZSTANDARD", False):
+            with tempfile.TemporaryDirectory() as working_directory:
+                with self.assertRaises(ImportError):
+                    write_json_file(working_directory, "test.json", {}, "zstd")
@@ -0,0 +1,89 @@
+import io
+import json
+import logging
+import logging.handlers
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+from pylibcklb.logging.common import create_logger, stop_queue_listener, stop_queue_listeners, LazyMessage, \
+    JsonFormatter, PrefixLogger, queue_listeners
+
+
+class Test(unittest.TestCase):
+
+    def test_create_logger_is_idempotent(self):
+        logger = create_logger("test_create_logger_is_idempotent", logging.INFO)
+        logger = create_logger("test_create_logger_is_idempotent", logging.INFO)
+        assert len(logger.handlers) == 1
+
+    def test_create_logger_keeps_foreign_handlers(self):
+        logger = logging.getLogger("test_create_logger_keeps_foreign_handlers")
+        foreign_handler = logging.NullHandler()
+        logger.addHandler(foreign_handler)
+        create_logger("test_create_logger_keeps_foreign_handlers")
+        create_logger("test_create_logger_keeps_foreign_handlers")
+        assert foreign_handler in logger.handlers
+        assert len(logger.handlers) == 2
+
+    def test_create_logger_with_queue(self):
+        stream = io.StringIO()
+        with patch("sys.stderr", stream):
+            logger = create_logger("test_create_logger_with_queue", logging.INFO, use_queue=True)
+            logger.info("Total: %s", 42)
+            logger.debug("Hidden")
+            stop_queue_listener("test_create_logger_with_queue")
+        assert "Total: 42" in stream.getvalue()
+        assert "Hidden" not in stream.getvalue()
+        assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+    def test_stop_queue_listeners(self):
+        stream = io.StringIO()
+        with patch("sys.stderr", stream):
+            for application_name in ["test_stop_queue_listeners_1", "test_stop_queue_listeners_2"]:
+                create_logger(application_name, logging.INFO, use_queue=True).info("Queued by %s", application_name)
+            # like at the exit of the interpreter, every queued record is written
+            stop_queue_listeners()
+        assert queue_listeners == {}
+        assert "Queued by test_stop_queue_listeners_1" in stream.getvalue()
+        assert "Queued by test_stop_queue_listeners_2" in stream.getvalue()
+
+    def test_create_logger_with_json_format(self):
+        stream = io.StringIO()
+        with patch("sys.stderr", stream):
+            logger = create_logger("test_create_logger_with_json_format", logging.INFO, log_format="json")
+            logger.warning("Core %s: %s%%", 1, 37.5)
+        entry = json.loads(stream.getvalue())
+        assert entry["message"] == "Core 1: 37.5%"
+        assert entry["level"] == "WARNING"
+        assert entry["name"] == "test_create_logger_with_json_format"
+
+    def test_create_logger_with_unknown_format(self):
+        with self.assertRaises(ValueError):
+            create_logger("test_create_logger_with_unknown_format", log_format="xml")
+
+    def test_prefix_logger(self):
+        with self.assertLogs("test_prefix_logger", logging.INFO) as logs:
+            logger = PrefixLogger(logging.getLogger("test_prefix_logger"), "cpu")
+            logger.info("Core %s: %s%%", 1, 37.5)
+            logger.debug("Hidden")
+        assert logs.output == ["INFO:test_prefix_logger:[cpu] Core 1: 37.5%"]
+
+    def test_json_formatter_with_exception(self):
+        try:
+            raise RuntimeError("broken")
+        except RuntimeError:
+            record = logging.getLogger("test").makeRecord("test", logging.ERROR, __file__, 1, "failed", (),
+                                                          sys.exc_info())
+        entry = json.loads(JsonFormatter().format(record))
+        assert "RuntimeError: broken" in entry["exception"]
+
+    def test_lazy_message_is_not_built_for_disabled_levels(self):
+        function = Mock(return_value="1.00KB")
+        with patch("sys.stderr", io.StringIO()) as stream:
+            logger = create_logger("test_lazy_message", logging.WARNING)
+            logger.info("Total: %s", LazyMessage(function, 1024))
+            function.assert_not_called()
+            logger.warning("Total: %s", LazyMessage(function, 1024))
+        function.assert_called_with(1024)
+        assert "Total: 1.00KB" in stream.getvalue()
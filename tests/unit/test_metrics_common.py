@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pylibcklb.json.common import create_json_file, load_data, iterate_data, append_json_lines
+from pylibcklb.metrics.common import span, increment, record_span, enable_metrics, disable_metrics, reset_metrics, \
+    get_metrics_summary, create_prometheus_text, export_metrics, is_metrics_enabled, NULL_SPAN
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        reset_metrics()
+        enable_metrics()
+
+    def tearDown(self):
+        disable_metrics()
+        reset_metrics()
+
+    def test_span_and_counters(self):
+        for _ in range(3):
+            with span("load_data"):
+                pass
+        record_span("collector_cpu", 1.5)
+        increment("documents")
+        increment("documents", 9)
+        summary = get_metrics_summary()
+        assert summary["spans"]["load_data"]["count"] == 3
+        assert summary["spans"]["load_data"]["seconds"] >= 0
+        assert summary["spans"]["collector_cpu"] == {"count": 1, "seconds": 1.5}
+        assert summary["counters"] == {"documents": 10}
+
+    def test_span_of_an_exception(self):
+        with self.assertRaises(ValueError):
+            with span("broken"):
+                raise ValueError("broken")
+        assert get_metrics_summary()["spans"]["broken"]["count"] == 1
+
+    def test_disabled_metrics(self):
+        assert is_metrics_enabled()
+        disable_metrics()
+        assert not is_metrics_enabled()
+        assert span("load_data") is NULL_SPAN
+        with span("load_data"):
+            increment("documents")
+        record_span("collector_cpu", 1.5)
+        assert get_metrics_summary() == {"spans": {}, "counters": {}}
+
+    def test_json_module_instrumentation(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            create_json_file(working_directory, "document.json", {"a": 1})
+            assert load_data(working_directory, "document.json") == {"a": 1}
+            append_json_lines(working_directory, "documents.json", [{"a": 1}, {"a": 2}])
+            assert len(list(iterate_data(working_directory, "documents.json"))) == 2
+        summary = get_metrics_summary()
+        assert {"read_file", "decode_json", "encode_json", "write_file"} <= set(summary["spans"])
+        assert summary["counters"]["bytes_read"] == len('{"a": 1}')
+        assert summary["counters"]["bytes_written"] == len('{"a": 1}') + len('{"a": 1}\n{"a": 2}\n')
+        assert summary["counters"]["documents_decoded"] == 2
+
+    def test_create_prometheus_text(self):
+        summary = {"spans": {"load_data": {"count": 2, "seconds": 0.25}},
+                   "counters": {"documents_written": 10, "bytes-read": 5}}
+        text = create_prometheus_text(summary, {"script": 'send"Json'})
+        assert 'pylibcklb_stage_seconds_total{script="send\\"Json",stage="load_data"} 0.25\n' in text
+        assert 'pylibcklb_stage_calls_total{script="send\\"Json",stage="load_data"} 2\n' in text
+        assert "# TYPE pylibcklb_documents_written_total counter\n" in text
+        assert 'pylibcklb_documents_written_total{script="send\\"Json"} 10\n' in text
+        assert 'pylibcklb_bytes_read_total{script="send\\"Json"} 5\n' in text
+
+    def test_export_metrics(self):
+        increment("batches")
+        with tempfile.TemporaryDirectory() as working_directory:
+            summary_filename = os.path.join(working_directory, "metrics.json")
+            textfile_filename = os.path.join(working_directory, "metrics.prom")
+            export_metrics(summary_filename, textfile_filename)
+            with open(summary_filename) as f:
+                assert json.load(f) == {"spans": {}, "counters": {"batches": 1}}
+            with open(textfile_filename) as f:
+                assert "pylibcklb_batches_total 1\n" in f.read()
+            assert sorted(os.listdir(working_directory)) == ["metrics.json", "metrics.prom"]
+
+    @patch("pylibcklb.json.common._new_file_mode", None)
+    def test_export_metrics_file_mode(self):
+        umask = os.umask(0o022)
+        try:
+            with tempfile.TemporaryDirectory() as working_directory:
+                textfile_filename = os.path.join(working_directory, "metrics.prom")
+                export_metrics(None, textfile_filename)
+                # readable by a node exporter that runs as another user
+                assert os.stat(textfile_filename).st_mode & 0o777 == 0o644
+                assert os.listdir(working_directory) == ["metrics.prom"]
+        finally:
+            os.umask(umask)
@@ -0,0 +1,101 @@
+import logging
+import sys
+import tempfile
+import unittest
+from datetime import timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from pylibcklb.buildenv.common import render_human_readable
+from pylibcklb.json.common import iterate_data, append_json_lines
+from pylibcklb.scripts.migrateBuildEnvInfo import get_arguments, main, migrate_collection, create_argumentparser, \
+    SCHEMA_VERSION_1_FILTER
+from tests.unit.test_buildenv_common import create_document_v2
+
+
+class Test(unittest.TestCase):
+
+    def test_get_arguments(self):
+        sys.argv = ["tests", "-v", "--dry-run"]
+        arguments = get_arguments()
+        assert arguments.loglevel == logging.INFO
+        assert arguments.is_dry_run
+
+    def test_main_no_arguments(self):
+        sys.argv = ["tests"]
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_main_no_connection_string(self):
+        sys.argv = ["tests", "-v"]
+        main()
+
+    def test_migrate_file(self):
+        documents = [render_human_readable(create_document_v2()), create_document_v2()]
+        with tempfile.TemporaryDirectory() as working_directory:
+            append_json_lines(working_directory, "build-env.json", documents)
+            sys.argv = ["tests", "-w", working_directory, "-json-filename", "build-env.json",
+                        "-json-output-filename", "build-env-v2.json.gz", "-b", "1"]
+            main()
+            migrated_documents = list(iterate_data(working_directory, "build-env-v2.json.gz"))
+            for migrated_document in migrated_documents:
+                # bson decodes dates as naive utc datetimes
+                system_information = migrated_document["system_information"]
+                system_information["boot_time"] = system_information["boot_time"].replace(tzinfo=timezone.utc)
+            assert migrated_documents == [create_document_v2()] * 2
+
+    def test_get_arguments_invalid_batch_size(self):
+        for value in ["0", "-1"]:
+            sys.argv = ["tests", "-b", value]
+            with pytest.raises(SystemExit) as e:
+                get_arguments()
+            assert e.value.code == 2
+
+    def test_migrate_file_dry_run(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            append_json_lines(working_directory, "build-env.json", [render_human_readable(create_document_v2())])
+            append_json_lines(working_directory, "build-env.json.v2.json", [{"data": "earlier run"}])
+            sys.argv = ["tests", "-w", working_directory, "-json-filename", "build-env.json", "--dry-run"]
+            main()
+            # the output of an earlier run stays in place
+            assert list(iterate_data(working_directory, "build-env.json.v2.json")) == [{"data": "earlier run"}]
+
+            sys.argv = sys.argv[:-1]
+            main()
+            assert [document["schema_version"] for document in
+                    iterate_data(working_directory, "build-env.json.v2.json")] == [2]
+
+    @patch("pylibcklb.scripts.migrateBuildEnvInfo.close_connection_to_mongodb")
+    @patch("pylibcklb.scripts.migrateBuildEnvInfo.select_collection")
+    @patch("pylibcklb.scripts.migrateBuildEnvInfo.create_connection_to_mongodb")
+    def test_migrate_collection(self, mock_create_connection_to_mongodb, mock_select_collection,
+                                mock_close_connection_to_mongodb):
+        documents = [dict(create_document_v2(), _id=i, schema_version=version) for i, version in enumerate([1, "1"])]
+        del documents[0]["schema_version"]
+        collection = MagicMock()
+        collection.find.side_effect = lambda query, batch_size: iter(documents)
+        collection.bulk_write.return_value.modified_count = 2
+        mock_select_collection.return_value = collection
+        sys.argv = ["tests", "-conn", "mongodb://localhost", "-b", "10", "--retries", "0"]
+        main()
+        # documents without schema_version or with a string schema_version are migrated too
+        collection.find.assert_called_once_with(SCHEMA_VERSION_1_FILTER, batch_size=10)
+        operations = collection.bulk_write.call_args[0][0]
+        assert [(operation._filter, operation._doc["schema_version"]) for operation in operations] == \
+               [({"_id": 0}, 2), ({"_id": 1}, 2)]
+        mock_close_connection_to_mongodb.assert_called_once()
+
+        args = create_argumentparser("tests").parse_args(["-conn", "mongodb://localhost", "--dry-run"])
+        collection.bulk_write.reset_mock()
+        assert migrate_collection(args, logging.getLogger("tests")) == {"documents": 2, "modified": 0, "errors": 0}
+        collection.bulk_write.assert_not_called()
+
+        collection.bulk_write.side_effect = BulkWriteError(
+            {"nMatched": 1, "nModified": 1, "writeErrors": [{"index": 1, "code": 121, "errmsg": "validation failed",
+                                                            "op": documents[1]}]})
+        args.is_dry_run = False
+        logger = MagicMock()
+        assert migrate_collection(args, logger) == {"documents": 2, "modified": 1, "errors": 1}
+        logger.error.assert_called_once_with("Batch 0: validation failed")
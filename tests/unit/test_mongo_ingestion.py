@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from pylibcklb.mongo.ingestion import ingest_documents, take_batch
+
+
+class ConcurrencyTrackingCollection:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.documents = []
+
+    def insert_many(self, documents, ordered):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+            self.documents.extend(documents)
+        return MagicMock(inserted_ids=[document["_id"] for document in documents])
+
+
+class Test(unittest.TestCase):
+
+    def test_take_batch(self):
+        iterator = iter(range(5))
+        assert take_batch(iterator, 3) == [0, 1, 2]
+        assert take_batch(iterator, 3) == [3, 4]
+        assert take_batch(iterator, 3) == []
+
+    def test_ingest_documents(self):
+        collection = ConcurrencyTrackingCollection()
+        documents = ({"_id": i} for i in range(95))
+        batch_results = ingest_documents(collection, documents, batch_size=10, max_concurrent_batches=3)
+        assert [batch_result["inserted"] for batch_result in batch_results] == [10] * 9 + [5]
+        assert sorted(document["_id"] for document in collection.documents) == list(range(95))
+        assert 1 <= collection.max_in_flight <= 3
+
+    def test_ingest_documents_empty(self):
+        collection = MagicMock()
+        assert ingest_documents(collection, [], batch_size=10) == []
+        collection.insert_many.assert_not_called()
+
+    def test_ingest_documents_replacement(self):
+        collection = MagicMock()
+        collection.bulk_write.return_value = MagicMock(matched_count=2, modified_count=1)
+        batch_results = ingest_documents(collection, [{"_id": 1}, {"_id": 2}], is_replacement=True)
+        assert batch_results[0]["matched"] == 2
+        assert batch_results[0]["modified"] == 1
+
+    def test_ingest_documents_invalid_options(self):
+        collection = MagicMock()
+        for options in [{"max_concurrent_batches": 0}, {"max_concurrent_batches": -1}, {"batch_size": 0}]:
+            with self.assertRaises(ValueError):
+                ingest_documents(collection, [{"_id": 1}], **options)
+        collection.insert_many.assert_not_called()
+
+    def test_ingest_documents_write_failure(self):
+        collection = MagicMock()
+        collection.insert_many.side_effect = ConnectionError("no server")
+        with self.assertRaises(ConnectionError):
+            ingest_documents(collection, ({"_id": i} for i in range(100)), batch_size=10,
+                             max_concurrent_batches=2)
+
+    def test_ingest_documents_read_failure(self):
+        def broken_documents():
+            yield {"_id": 1}
+            raise ValueError("broken file")
+
+        with self.assertRaises(ValueError):
+            ingest_documents(MagicMock(), broken_documents(), batch_size=1)
@@ -0,0 +1,105 @@
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime
+
+import bson
+from bson import ObjectId, Int64, Decimal128, Binary, Code, Timestamp, DBRef, MinKey, MaxKey, Regex
+from bson.code import Code as CodeWithScope
+from bson.errors import InvalidBSON
+from bson.raw_bson import RawBSONDocument
+
+from pylibcklb.mongo.common import check_id
+from pylibcklb.mongo.rawbson import is_bson_file, iterate_bson_documents, get_top_level_element_types, \
+    apply_raw_adaptations
+
+
+def create_bson_test_file(working_directory: str, bson_filename: str, documents: list):
+    with open(os.path.join(working_directory, bson_filename), "wb") as f:
+        for document in documents:
+            f.write(bson.encode(document))
+
+
+class Test(unittest.TestCase):
+
+    def test_is_bson_file(self):
+        assert is_bson_file("dump/builds.bson")
+        assert is_bson_file("BUILDS.BSON")
+        assert not is_bson_file("builds.json")
+
+    def test_iterate_bson_documents(self):
+        documents = [{"_id": ObjectId(), "index": i, "date": datetime(2022, 9, 11)} for i in range(10)]
+        with tempfile.TemporaryDirectory() as working_directory:
+            create_bson_test_file(working_directory, "test.bson", documents)
+            raw_documents = list(iterate_bson_documents(working_directory, "test.bson"))
+        assert all(isinstance(raw_document, RawBSONDocument) for raw_document in raw_documents)
+        assert [bson.decode(raw_document.raw) for raw_document in raw_documents] == documents
+
+    def test_iterate_bson_documents_empty_file(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            create_bson_test_file(working_directory, "test.bson", [])
+            assert list(iterate_bson_documents(working_directory, "test.bson")) == []
+
+    def test_iterate_bson_documents_broken_files(self):
+        raw = bson.encode({"data": "tests"})
+        with tempfile.TemporaryDirectory() as working_directory:
+            for content in [raw + raw[:3], raw + raw[:-1], raw[:-1] + b"\x01"]:
+                with open(os.path.join(working_directory, "test.bson"), "wb") as f:
+                    f.write(content)
+                with self.assertRaises(InvalidBSON):
+                    list(iterate_bson_documents(working_directory, "test.bson"))
+
+    def test_get_top_level_element_types(self):
+        document = {"double": 1.5, "string": "text", "document": {"a": 1}, "array": [1, 2], "binary": Binary(b"x"),
+                    "_id": ObjectId(), "bool": True, "date": datetime(2022, 9, 11), "null": None,
+                    "regex": Regex("^a", "i"), "code": Code("x"), "code_with_scope": CodeWithScope("x", {"a": 1}),
+                    "int32": 1, "timestamp": Timestamp(1, 2), "int64": Int64(2 ** 40),
+                    "decimal": Decimal128("1.5"), "min": MinKey(), "max": MaxKey(),
+                    "reference": DBRef("collection", ObjectId()), "pattern": re.compile("b")}
+        element_types = get_top_level_element_types(bson.encode(document))
+        assert sorted(element_types) == sorted(document)
+        assert element_types["_id"] == 0x07
+        assert element_types["string"] == 0x02
+        assert element_types["int64"] == 0x12
+
+    def test_get_top_level_element_types_db_pointer(self):
+        # the deprecated DBPointer type can not be created with the bson encoder anymore
+        elements = b"\x0cpointer\x00" + b"\x02\x00\x00\x00c\x00" + ObjectId().binary + b"\x10a\x00\x01\x00\x00\x00"
+        raw = (len(elements) + 5).to_bytes(4, "little") + elements + b"\x00"
+        assert get_top_level_element_types(raw) == {"pointer": 0x0C, "a": 0x10}
+
+    def test_get_top_level_element_types_unknown_type(self):
+        with self.assertRaises(InvalidBSON):
+            get_top_level_element_types(b"\x0a\x00\x00\x00\x20a\x00\x00\x00\x00")
+
+    def test_apply_raw_adaptations_no_adaptations_needed(self):
+        raw_document = RawBSONDocument(bson.encode({"_id": ObjectId(), "schema_version": 1, "data": "tests"}))
+        assert apply_raw_adaptations(raw_document) is raw_document
+
+    def test_apply_raw_adaptations_missing_fields(self):
+        raw_document = RawBSONDocument(bson.encode({"data": "tests", "nested": {"_id": 1}}))
+        data = bson.decode(apply_raw_adaptations(raw_document).raw)
+        assert list(data) == ["_id", "data", "nested", "schema_version"]
+        assert isinstance(data["_id"], ObjectId)
+        assert data["schema_version"] == 1
+
+    def test_apply_raw_adaptations_missing_schema_version(self):
+        document_id = ObjectId()
+        raw_document = RawBSONDocument(bson.encode({"_id": document_id}))
+        assert bson.decode(apply_raw_adaptations(raw_document).raw) == {"_id": document_id, "schema_version": 1}
+
+    def test_apply_raw_adaptations_convert_strings(self):
+        document_id = ObjectId()
+        raw_document = RawBSONDocument(bson.encode({"_id": str(document_id), "schema_version": "2"}))
+        assert bson.decode(apply_raw_adaptations(raw_document).raw) == {"_id": document_id, "schema_version": 2}
+
+    def test_apply_raw_adaptations_content_id(self):
+        content = {"data": "tests", "created": datetime(2022, 9, 11)}
+        raw_document = RawBSONDocument(bson.encode(content))
+        data = bson.decode(apply_raw_adaptations(raw_document, use_content_id=True).raw)
+        # the same _id as for the document decoded from json
+        assert data["_id"] == check_id(dict(content), use_content_id=True)["_id"]
+        assert data["schema_version"] == 1
+        raw_document = RawBSONDocument(bson.encode({"_id": 1, "schema_version": 1, "data": "tests"}))
+        assert apply_raw_adaptations(raw_document, use_content_id=True) is raw_document
@@ -0,0 +1,195 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from pylibcklb.mongo.rawbson import iterate_bson_documents
+from pylibcklb.mongo.spool import Spool, DrainThread, list_segments, drain_spool, get_complete_size, \
+    claim_segment, ACTIVE_EXTENSION, CLAIMED_EXTENSION, REJECTED_DIRECTORY
+
+
+class Test(unittest.TestCase):
+
+    def test_append_and_rotate(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            documents = [{"_id": ObjectId(), "data": i} for i in range(3)]
+            with Spool(working_directory) as spool:
+                spool.append(documents[:2])
+                spool.append([RawBSONDocument(bson.encode(documents[2]))])
+                spool.append([])
+                # the active segment is not drained yet
+                assert list_segments(working_directory) == []
+                assert os.listdir(working_directory)[0].endswith(ACTIVE_EXTENSION)
+            segments = list_segments(working_directory)
+            assert len(segments) == 1
+            assert [bson.decode(document.raw) for document in
+                    iterate_bson_documents(working_directory, segments[0])] == documents
+
+    def test_segment_max_bytes(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory, segment_max_bytes=1) as spool:
+                for i in range(3):
+                    spool.append([{"_id": i}])
+            segments = list_segments(working_directory)
+            assert len(segments) == 3
+            assert segments == sorted(segments)
+
+    def test_list_segments_seals_stale_segment(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            spool = Spool(working_directory)
+            spool.append([{"_id": 1}, {"_id": 2}])
+            # a crashed writer leaves a partial document at the end of the active segment
+            spool.file.write(bson.encode({"_id": 3})[:7])
+            spool.file.close()
+            assert list_segments(working_directory, stale_after_sec=3600) == []
+            old_time = time.time() - 7200
+            os.utime(spool.active_path, (old_time, old_time))
+            segments = list_segments(working_directory, stale_after_sec=3600)
+            assert len(segments) == 1
+            assert [document["_id"] for document in iterate_bson_documents(working_directory, segments[0])] == [1, 2]
+
+    def test_list_segments_vanished_segment(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            spool = Spool(working_directory)
+            spool.append([{"_id": 1}])
+            spool.file.close()
+            # another drain sealed the stale segment between the listing and the check of its age
+            with patch("pylibcklb.mongo.spool.os.path.getmtime", side_effect=FileNotFoundError):
+                assert list_segments(working_directory, stale_after_sec=0) == []
+            # a complete stale segment is sealed without a truncation
+            assert len(list_segments(working_directory, stale_after_sec=0)) == 1
+
+    def test_claim_segment(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory) as spool:
+                spool.append([{"_id": 1}])
+            name = list_segments(working_directory)[0]
+            claimed_name = claim_segment(working_directory, name)
+            assert claimed_name.endswith(CLAIMED_EXTENSION)
+            # a concurrent drain does not get the segment
+            assert claim_segment(working_directory, name) is None
+            assert list_segments(working_directory) == []
+            collection = MagicMock()
+            assert drain_spool(working_directory, collection, stale_after_sec=3600)["segments"] == 0
+            # the other drain claimed it after this drain listed the segments
+            with patch("pylibcklb.mongo.spool.list_segments", return_value=[name]):
+                assert drain_spool(working_directory, collection)["segments"] == 0
+            collection.insert_many.assert_not_called()
+
+            # the claim of a crashed drain is released when it is stale
+            old_time = time.time() - 7200
+            os.utime(os.path.join(working_directory, claimed_name), (old_time, old_time))
+            assert list_segments(working_directory, stale_after_sec=3600) == [name]
+
+    def test_get_complete_size(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            filename = os.path.join(working_directory, "segment.open")
+            document = bson.encode({"_id": 1})
+            with open(filename, 'wb') as f:
+                f.write(document + document[:3])
+            assert get_complete_size(filename) == len(document)
+
+    def test_drain_spool(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory, segment_max_bytes=1) as spool:
+                spool.append([{"_id": 1}, {"_id": 2}])
+                spool.append([{"_id": 3}])
+
+            def insert_many(documents, ordered):
+                # 1 is already stored by an earlier drain, 2 is rejected
+                write_errors = [{"index": 0, "code": 11000, "errmsg": "duplicate key", "op": documents[0]}]
+                if len(documents) == 2:
+                    write_errors.append({"index": 1, "code": 121, "errmsg": "validation failed",
+                                         "op": documents[1]})
+                    raise BulkWriteError({"nInserted": 0, "writeErrors": write_errors})
+
+            collection = MagicMock()
+            collection.insert_many.side_effect = insert_many
+            summary = drain_spool(working_directory, collection, batch_size=10)
+            assert summary == {"segments": 2, "documents": 3, "rejected": 1, "is_complete": True}
+            assert list_segments(working_directory) == []
+            rejected_directory = os.path.join(working_directory, REJECTED_DIRECTORY)
+            rejected_segments = list_segments(rejected_directory)
+            assert [document["_id"] for document in
+                    iterate_bson_documents(rejected_directory, rejected_segments[0])] == [2]
+
+    def test_drain_spool_connection_failure(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory, segment_max_bytes=1) as spool:
+                spool.append([{"_id": 1}])
+                spool.append([{"_id": 2}])
+            collection = MagicMock()
+            collection.insert_many.side_effect = [None, AutoReconnect("connection refused")]
+            summary = drain_spool(working_directory, collection)
+            assert summary == {"segments": 1, "documents": 1, "rejected": 0, "is_complete": False}
+            # the segment that was not acknowledged stays for the next drain
+            segments = list_segments(working_directory)
+            assert [document["_id"] for document in iterate_bson_documents(working_directory, segments[0])] == [2]
+
+            collection.insert_many.side_effect = None
+            assert drain_spool(working_directory, collection)["is_complete"]
+            assert list_segments(working_directory) == []
+
+    def test_drain_spool_missing_directory(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            summary = drain_spool(os.path.join(working_directory, "spool"), MagicMock())
+            assert summary == {"segments": 0, "documents": 0, "rejected": 0, "is_complete": True}
+
+    def test_drain_spool_write_concern_errors(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory) as spool:
+                spool.append([{"_id": 1}, {"_id": 2}])
+            collection = MagicMock()
+            collection.insert_many.side_effect = BulkWriteError(
+                {"nInserted": 2, "writeErrors": [],
+                 "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}]})
+            summary = drain_spool(working_directory, collection)
+            assert summary == {"segments": 0, "documents": 0, "rejected": 0, "is_complete": False}
+            # the segment is not acknowledged and stays for the next drain
+            assert len(list_segments(working_directory)) == 1
+
+    def test_drain_spool_transient_errors(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory) as spool:
+                spool.append([{"_id": 1}, {"_id": 2}])
+            collection = MagicMock()
+            # still failing after the retries, e.g. the primary steps down
+            collection.insert_many.side_effect = BulkWriteError(
+                {"nInserted": 1, "writeErrors": [{"index": 1, "code": 189, "errmsg": "primary stepped down",
+                                                  "op": {"_id": 2}}]})
+            summary = drain_spool(working_directory, collection)
+            assert summary == {"segments": 0, "documents": 0, "rejected": 0, "is_complete": False}
+            # the document is not rejected, the segment stays for the next drain
+            assert len(list_segments(working_directory)) == 1
+            assert not os.path.exists(os.path.join(working_directory, REJECTED_DIRECTORY))
+
+    def test_drain_thread_survives_errors(self):
+        with tempfile.TemporaryDirectory() as working_directory:
+            with Spool(working_directory) as spool:
+                spool.append([{"_id": 1}])
+            collection = MagicMock()
+            drained = threading.Event()
+
+            def insert_many(documents, ordered):
+                # the first drain fails with an error that is not a connection failure
+                if not insert_many.failed:
+                    insert_many.failed = True
+                    raise OperationFailure("not authorized", code=13)
+                drained.set()
+
+            insert_many.failed = False
+            collection.insert_many.side_effect = insert_many
+            logger = MagicMock()
+            drain_thread = DrainThread(working_directory, collection, 0.01, logger)
+            drain_thread.start()
+            assert drained.wait(5)
+            drain_thread.stop()
+            logger.exception.assert_called()
+            assert list_segments(working_directory) == []
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import struct
+import tempfile
+import unittest
+
+from pylibcklb.software.common import iterate_dpkg_packages, parse_rpm_header, iterate_rpm_packages, \
+    iterate_python_distributions, get_inventory_sources, get_inventory_cache_key, collect_linux_software
+
+DPKG_STATUS = """Package: adduser
+Status: install ok installed
+Priority: important
+Architecture: all
+Version: 3.134
+Description: add and remove users and groups
+ This package includes the 'adduser' and 'deluser' commands.
+ Version: 1.0 is not a field of the paragraph
+
+Package: removed
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 1.0
+
+Package: libc6
+Status: install ok installed
+Architecture: amd64
+Version: 2.36-9
+"""
+
+
+def create_rpm_header(tags: list) -> bytes:
+    # tags as (tag, type, value) with the types 4 (int32) and 6 (string)
+    entries = b""
+    data = b""
+    for tag, tag_type, value in tags:
+        if tag_type == 4:
+            data += b"\x00" * (-len(data) % 4)
+            entries += struct.pack(">iiii", tag, tag_type, len(data), 1)
+            data += struct.pack(">i", value)
+        else:
+            entries += struct.pack(">iiii", tag, tag_type, len(data), 1)
+            data += value.encode("utf-8") + b"\x00"
+    return struct.pack(">II", len(tags), len(data)) + entries + data
+
+
+def create_rpm_database(database_file: str, headers: list):
+    connection = sqlite3.connect(database_file)
+    connection.execute("CREATE TABLE Packages (hnum INTEGER PRIMARY KEY AUTOINCREMENT, blob BLOB NOT NULL)")
+    connection.executemany("INSERT INTO Packages (blob) VALUES (?)", [(header,) for header in headers])
+    connection.commit()
+    connection.close()
+
+
+def create_python_distribution(path: str, name: str, version: str, egg_info: bool = False):
+    directory = os.path.join(path, f"{name}-{version}.{'egg-info' if egg_info else 'dist-info'}")
+    os.makedirs(directory)
+    with open(os.path.join(directory, "PKG-INFO" if egg_info else "METADATA"), 'w') as f:
+        f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\nName: not-the-name\n")
+
+
+class Test(unittest.TestCase):
+
+    def test_iterate_dpkg_packages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            status_file = os.path.join(directory, "status")
+            with open(status_file, 'w') as f:
+                f.write(DPKG_STATUS)
+            assert list(iterate_dpkg_packages(status_file)) == [
+                {"name": "adduser", "version": "3.134", "architecture": "all", "source": "dpkg"},
+                {"name": "libc6", "version": "2.36-9", "architecture": "amd64", "source": "dpkg"}]
+
+    def test_parse_rpm_header(self):
+        header = create_rpm_header([(63, 7, "region"), (1000, 6, "bash"), (1001, 6, "5.2.15"), (1002, 6, "3.fc38"),
+                                    (1003, 4, 1), (1022, 6, "x86_64")])
+        assert parse_rpm_header(header) == {"name": "bash", "version": "5.2.15", "release": "3.fc38", "epoch": 1,
+                                            "architecture": "x86_64"}
+
+    def test_iterate_rpm_packages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database_file = os.path.join(directory, "rpmdb.sqlite")
+            create_rpm_database(database_file, [
+                create_rpm_header([(1000, 6, "bash"), (1001, 6, "5.2.15"), (1002, 6, "3.fc38"),
+                                   (1022, 6, "x86_64")]),
+                create_rpm_header([(1000, 6, "gpg-pubkey"), (1001, 6, "5a6340b3"), (1003, 4, 2)])])
+            assert list(iterate_rpm_packages(database_file)) == [
+                {"name": "bash", "version": "5.2.15-3.fc38", "architecture": "x86_64", "source": "rpm"},
+                {"name": "gpg-pubkey", "version": "2:5a6340b3", "architecture": None, "source": "rpm"}]
+
+    def test_iterate_python_distributions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            create_python_distribution(directory, "pymongo", "4.2.0")
+            create_python_distribution(directory, "legacy", "0.1", egg_info=True)
+            os.makedirs(os.path.join(directory, "broken-1.0.dist-info"))
+            # a single file egg-info holds the metadata itself
+            with open(os.path.join(directory, "single-2.0.egg-info"), 'w') as f:
+                f.write("Metadata-Version: 1.0\nName: single\nVersion: 2.0\n")
+            assert list(iterate_python_distributions([directory])) == [
+                {"name": "legacy", "version": "0.1", "architecture": None, "source": "python", "path": directory},
+                {"name": "pymongo", "version": "4.2.0", "architecture": None, "source": "python",
+                 "path": directory},
+                {"name": "single", "version": "2.0", "architecture": None, "source": "python", "path": directory}]
+
+    def test_iterate_python_distributions_sys_path(self):
+        names = [distribution["name"] for distribution in iterate_python_distributions()]
+        assert "pymongo" in names
+
+    def test_collect_linux_software(self):
+        with tempfile.TemporaryDirectory() as directory:
+            status_file = os.path.join(directory, "status")
+            with open(status_file, 'w') as f:
+                f.write(DPKG_STATUS)
+            create_python_distribution(directory, "pymongo", "4.2.0")
+            sources = get_inventory_sources(status_file, os.path.join(directory, "missing.sqlite"), [directory])
+            assert sources == {"dpkg": [status_file], "rpm": [], "python": [directory]}
+            cache_key = get_inventory_cache_key(sources)
+            assert [path for path, _ in cache_key["dpkg"] + cache_key["python"]] == [status_file, directory]
+            assert [software["source"] for software in collect_linux_software(sources)] == \
+                   ["dpkg", "dpkg", "python"]
+
+            create_python_distribution(directory, "psutil", "5.9.2")
+            os.utime(directory, ns=(0, 0))
+            assert get_inventory_cache_key(sources) != cache_key
+
+            database_file = os.path.join(directory, "rpmdb.sqlite")
+            create_rpm_database(database_file, [create_rpm_header([(1000, 6, "bash"), (1001, 6, "5.2.15")])])
+            assert collect_linux_software({"dpkg": [], "rpm": [database_file], "python": []}) == [
+                {"name": "bash", "version": "5.2.15", "architecture": None, "source": "rpm"}]
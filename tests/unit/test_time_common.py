@@ -0,0 +1,55 @@
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from pylibcklb.time.common import get_current_utc_time_ms, format_epoch_ms, get_epoch_ms, get_current_utc_time, \
+    epoch_ms_to_datetime, stamp_documents, Timer
+
+
+class Test(unittest.TestCase):
+
+    def test_format_epoch_ms(self):
+        epoch_ms = 1662897600123
+        reference = datetime.fromtimestamp(epoch_ms / 1000, timezone.utc)
+        assert format_epoch_ms(epoch_ms) == "2022-09-11T12:00:00.123"
+        assert format_epoch_ms(epoch_ms) == reference.replace(tzinfo=None).isoformat(timespec='milliseconds')
+        assert format_epoch_ms(epoch_ms, with_offset=True) == reference.isoformat(timespec='milliseconds')
+        # the cached prefix of the previous second is not reused
+        assert format_epoch_ms(epoch_ms + 1000) == "2022-09-11T12:00:01.123"
+        assert format_epoch_ms(epoch_ms - 123) == "2022-09-11T12:00:00.000"
+        assert format_epoch_ms(0) == "1970-01-01T00:00:00.000"
+
+    def test_get_current_utc_time_ms(self):
+        with patch("pylibcklb.time.common.time.time_ns", return_value=1662897600123456789):
+            assert get_current_utc_time_ms() == "2022-09-11T12:00:00.123"
+            assert get_current_utc_time_ms(with_offset=True) == "2022-09-11T12:00:00.123+00:00"
+            assert get_epoch_ms() == 1662897600123
+
+    def test_get_current_utc_time_ms_is_parseable(self):
+        before = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+        assert datetime.fromisoformat(get_current_utc_time_ms()) >= before
+        assert datetime.fromisoformat(get_current_utc_time_ms(with_offset=True)).tzinfo == timezone.utc
+
+    def test_get_current_utc_time(self):
+        assert get_current_utc_time().tzinfo == timezone.utc
+
+    def test_epoch_ms_to_datetime(self):
+        assert epoch_ms_to_datetime(1662897600123) == datetime(2022, 9, 11, 12, 0, 0, 123000, tzinfo=timezone.utc)
+
+    def test_stamp_documents(self):
+        documents = stamp_documents([{"a": 1}, {"a": 2}])
+        assert documents[0]["created_ms"] == documents[1]["created_ms"]
+        assert abs(documents[0]["created_ms"] - time.time() * 1000) < 60000
+        assert stamp_documents([{}], "timestamp", 5) == [{"timestamp": 5}]
+
+    def test_timer(self):
+        timer = Timer()
+        assert timer.elapsed_ns == 0
+        with timer:
+            time.sleep(0.01)
+            assert timer.elapsed_sec > 0
+        elapsed_sec = timer.elapsed_sec
+        assert elapsed_sec >= 0.01
+        assert timer.elapsed_sec == elapsed_sec
+        assert timer.start().stop() < elapsed_sec
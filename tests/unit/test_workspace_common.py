@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from pylibcklb.workspace.common import scan_workspace, hash_file, get_workspace_index_file, stat_file, scan_directory
+
+
+def create_file(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def create_workspace(root: str):
+    create_file(os.path.join(root, "README.md"), b"readme")
+    create_file(os.path.join(root, "src", "main.py"), b"x" * 100)
+    create_file(os.path.join(root, "src", "package", "module.py"), b"y" * 50)
+    create_file(os.path.join(root, "data", "large.bin"), b"z" * 1000)
+    create_file(os.path.join(root, ".git", "objects", "pack"), b"p" * 5000)
+    create_file(os.path.join(root, "src", ".git", "HEAD"), b"ref")
+
+
+class Test(unittest.TestCase):
+
+    def test_scan_workspace(self):
+        with tempfile.TemporaryDirectory() as root:
+            create_workspace(root)
+            # symlinks are neither files nor directories of the workspace
+            os.symlink("README.md", os.path.join(root, "link.md"))
+            os.symlink("package", os.path.join(root, "src", "link"))
+            workspace_information = scan_workspace(root, [".git"], largest_count=2)
+            assert workspace_information["file_count"] == 4
+            assert workspace_information["directory_count"] == 3
+            assert workspace_information["total_size"] == 1156
+            assert workspace_information["largest_files"] == [
+                {"path": os.path.join("data", "large.bin"), "size": 1000},
+                {"path": os.path.join("src", "main.py"), "size": 100}]
+            assert workspace_information["top_level"] == [{"name": "data", "file_count": 1, "size": 1000},
+                                                          {"name": "src", "file_count": 2, "size": 150},
+                                                          {"name": ".", "file_count": 1, "size": 6}]
+            assert "changes" not in workspace_information
+            assert "content_hash" not in workspace_information
+
+    def test_scan_workspace_without_filter(self):
+        with tempfile.TemporaryDirectory() as root:
+            create_workspace(root)
+            assert scan_workspace(root)["file_count"] == 6
+
+    def test_scan_workspace_hashes(self):
+        with tempfile.TemporaryDirectory() as root:
+            create_workspace(root)
+            workspace_information = scan_workspace(root, [".git"], with_hashes=True, workers=2)
+            assert workspace_information["hashed_files"] == 4
+            assert workspace_information["largest_files"][0]["hash"] == \
+                   hash_file(os.path.join(root, "data", "large.bin"))
+            create_file(os.path.join(root, "README.md"), b"changed")
+            assert scan_workspace(root, [".git"], with_hashes=True)["content_hash"] != \
+                   workspace_information["content_hash"]
+
+    def test_stat_file_vanished(self):
+        entry = MagicMock()
+        entry.stat.side_effect = FileNotFoundError("vanished")
+        assert stat_file(entry) is None
+        entry.stat.side_effect = PermissionError("denied")
+        assert stat_file(entry) is None
+
+    def test_scan_workspace_vanished_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            create_workspace(root)
+            real_stat_file = stat_file
+
+            def stat_file_without_readme(entry):
+                # the README.md and the main.py are deleted between the listing and the stat
+                return None if entry.name in ["README.md", "main.py"] else real_stat_file(entry)
+
+            with patch("pylibcklb.workspace.common.stat_file", side_effect=stat_file_without_readme):
+                workspace_information = scan_workspace(root, [".git"])
+            assert workspace_information["file_count"] == 2
+            assert workspace_information["skipped_files"] == 2
+
+    def test_scan_directory_vanished_directory(self):
+        with tempfile.TemporaryDirectory() as root:
+            assert scan_directory(root, "vanished", set()) == ([], 0, 1)
+            create_workspace(root)
+            with patch("pylibcklb.workspace.common.os.scandir", side_effect=PermissionError("denied")):
+                assert scan_directory(root, "src", set()) == ([], 0, 1)
+
+    def test_scan_workspace_unreadable_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            create_workspace(root)
+            real_hash_file = hash_file
+
+            def hash_file_without_permission(path, algorithm):
+                if path.endswith("large.bin"):
+                    raise PermissionError("denied")
+                return real_hash_file(path, algorithm)
+
+            with patch("pylibcklb.workspace.common.hash_file", side_effect=hash_file_without_permission):
+                workspace_information = scan_workspace(root, [".git"], with_hashes=True)
+            assert workspace_information["hashed_files"] == 3
+            assert workspace_information["skipped_files"] == 1
+            assert workspace_information["largest_files"][0]["hash"] is None
+
+    def test_scan_workspace_index(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cache_directory:
+            create_workspace(root)
+            index_file = os.path.join(cache_directory, "index.json")
+            # the scan time lies after the mtime of every file, so no entry is racy
+            with patch("pylibcklb.workspace.common.time.time_ns", return_value=2 ** 62):
+                workspace_information_1 = scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)
+                assert workspace_information_1["changes"] == {"added": 4, "modified": 0, "removed": 0}
+                assert workspace_information_1["hashed_files"] == 4
+
+                create_file(os.path.join(root, "src", "main.py"), b"x" * 101)
+                os.remove(os.path.join(root, "README.md"))
+                create_file(os.path.join(root, "data", "new.bin"), b"n")
+                workspace_information_2 = scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)
+                assert workspace_information_2["changes"] == {"added": 1, "modified": 1, "removed": 1}
+                assert workspace_information_2["hashed_files"] == 2
+
+                # a scan without hashes keeps the hashes of the index
+                scan_workspace(root, [".git"], index_file=index_file)
+                assert scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)["hashed_files"] == 0
+
+                # the index of an unchanged workspace is not written again
+                with patch("pylibcklb.workspace.common.store_workspace_index") as mock_store_workspace_index:
+                    scan_workspace(root, [".git"], index_file=index_file)
+                    scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)
+                    mock_store_workspace_index.assert_not_called()
+                    create_file(os.path.join(root, "data", "new.bin"), b"changed")
+                    scan_workspace(root, [".git"], index_file=index_file)
+                    mock_store_workspace_index.assert_called_once()
+
+    def test_scan_workspace_index_racy_entries(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cache_directory:
+            create_workspace(root)
+            index_file = os.path.join(cache_directory, "index.json")
+            with patch("pylibcklb.workspace.common.time.time_ns", return_value=0):
+                scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)
+                assert scan_workspace(root, [".git"], with_hashes=True, index_file=index_file)["hashed_files"] == 4
+
+    def test_get_workspace_index_file(self):
+        assert get_workspace_index_file("/workspace/a") != get_workspace_index_file("/workspace/b")
+        assert get_workspace_index_file("/workspace/a").endswith(".json")